@@ -20,6 +20,7 @@ from zopsm.lib.rest.resource import ResourceListResource
 from zopsm.lib.rest.resource import Ping
 from graceful.resources.generic import ListCreateAPI
 from zopsm.lib.sd_redis import redis_db_pw
+from zopsm.lib.redis_scripts import scripts
 
 container_name = os.getenv('CONTAINER_NAME', 'auth')
 container_port = os.getenv('CONTAINER_PORT', 8000)
@@ -163,64 +164,19 @@ class UserTokenCreate(ZopsBaseResource, ListCreateAPI):
         new_refresh_token = generate_user_token()
         new_access_token = generate_user_token(lenght=128)
 
-        # redis keys for tokens
-        refresh_token_key = cache.hmget(CACHE_TOKENS_KEYS, refresh_token)[0]
-
-        user_info_byte = cache.hgetall(refresh_token_key)
-        if not user_info_byte:
+        # rotates the tokens atomically in a single round trip
+        user_info = scripts.run(
+            cache, 'rotate_tokens',
+            keys=[CACHE_TOKENS_KEYS],
+            args=[refresh_token, new_refresh_token, new_access_token,
+                  CACHE_ACCESS_TOKEN_EXPIRES_IN, CACHE_REFRESH_TOKEN, CACHE_ACCESS_TOKEN,
+                  CACHE_SERVICE_TOKEN_LIST])
+        if not user_info:
             raise HTTPUnauthorized(
                 title="Unauthorized",
                 description="Invalid token"
             )
-        user_info = {}
-        for k, v in user_info_byte.items():
-            user_info[k.decode()] = v.decode()
-
-        new_refresh_token_key = CACHE_REFRESH_TOKEN.format(
-            project_id=user_info.get('project'),
-            service=user_info.get('service'),
-            token=new_refresh_token,
-        )
-        new_access_token_key = CACHE_ACCESS_TOKEN.format(
-            project_id=user_info.get('project'),
-            service=user_info.get('service'),
-            token=new_access_token,
-        )
-
-        cache_service_tokens_key = CACHE_SERVICE_TOKEN_LIST.format(
-            project_id=user_info.get('project'),
-            service=user_info.get('service')
-        )
-
-        # old access token
-        access_token = user_info.pop('access_token', None)
-        access_token_key = cache.hmget(CACHE_TOKENS_KEYS, access_token)[0]
-
-        # delete old access token from redis
-        cache.delete(access_token_key)
-        cache.hdel(CACHE_TOKENS_KEYS, access_token)
-
-        # add the access and refresh token in service_tokens
-        cache.sadd(cache_service_tokens_key, new_access_token)
-        cache.sadd(cache_service_tokens_key, new_refresh_token)
-
-        # set the new access token
-        cache.hmset(new_access_token_key, user_info)
-        cache.hset(CACHE_TOKENS_KEYS, new_access_token, new_access_token_key)
-
-        # update user_info with access token which corresponds to new refresh token
-        user_info['access_token'] = new_access_token
-
-        # set the new refresh token with updated user_info
-        cache.hmset(new_refresh_token_key, user_info)
-        cache.hset(CACHE_TOKENS_KEYS, new_refresh_token, new_refresh_token_key)
-
-        # remove the old refresh token from redis
-        cache.delete(refresh_token_key)
-        cache.hdel(CACHE_TOKENS_KEYS, refresh_token)
 
-        # set expire time for the access token
-        cache.expire(new_access_token_key, CACHE_ACCESS_TOKEN_EXPIRES_IN)
         return {
             "refresh_token": new_refresh_token,
             "access_token": new_access_token,
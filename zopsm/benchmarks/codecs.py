@@ -0,0 +1,98 @@
+"""
+Benchmark of the codecs of ``zopsm.lib.codec`` on payloads shaped like the replies of the workers
+and the events of the event processor.
+
+Payloads are built like the replies of ``list_messages`` and ``list_push_segments`` with a page
+of 100 objects, ``list_clients`` of a target with 20 clients, ``get_obj_data`` of a subscriber
+with 1000 contacts, and a ``channel_message_event`` log message. Each payload is encoded and
+decoded with each codec, the average time of an operation and the encoded size are printed.
+
+Usage:
+    python -m zopsm.benchmarks.codecs [number]
+"""
+import sys
+import timeit
+
+from zopsm.lib.codec import codecs
+from zopsm.lib.utility import generate_uuid
+
+NUMBER = 1000
+PAGE_SIZE = 100
+SENT_TIME = "2017-08-20T08:54:56.750Z00:00"
+
+
+def creation_info():
+    return {'creation_time': SENT_TIME, 'last_update_time': SENT_TIME, 'is_deleted': False,
+            'is_active': True}
+
+
+def message():
+    return dict(id=generate_uuid(), title="Meeting", body="Merhaba, toplantı saat 15:00'te "
+                "başlayacak. Lütfen gecikmeyin!", sentTime=SENT_TIME, sender=generate_uuid(),
+                receiver="", channel=generate_uuid(), **creation_info())
+
+
+def client():
+    return dict(id=generate_uuid(), token=generate_uuid() * 4, appVersion="2.3.1",
+                deviceType="android", language="tr", country="TR", osVersion="8.1.0",
+                **creation_info())
+
+
+def segment():
+    return dict(id=generate_uuid(), name="Active Istanbul users", residents={
+        "sets": {name: {"key": generate_uuid(), "type": "tag"} for name in "abcd"},
+        "expression": "(a - b) - (c - d)"}, **creation_info())
+
+
+def subscriber(contact_count=1000):
+    return dict(
+        last_status_message="Hello world!",
+        contacts={generate_uuid(): {"id": generate_uuid()} for _ in range(contact_count)},
+        channels={generate_uuid(): {"lastReadMessageId": generate_uuid()}
+                  for _ in range(contact_count // 10)},
+        banned_channels={}, banned_subscribers={generate_uuid(): ""},
+        contact_requests_in={}, contact_requests_out={}, **creation_info())
+
+
+def event():
+    return {"purpose": "event", "method": "channel_message_event",
+            "params": {"channelId": generate_uuid(), "data": message()}}
+
+
+def payloads():
+    return {
+        "list_messages": {"jsonrpc": "2.0", "id": generate_uuid(), "result": {
+            "continuation": generate_uuid(), "results": [message() for _ in range(PAGE_SIZE)]}},
+        "list_push_segments": {"jsonrpc": "2.0", "id": generate_uuid(), "result": {
+            "continuation": generate_uuid(), "results": [segment() for _ in range(PAGE_SIZE)]}},
+        "list_clients": {"jsonrpc": "2.0", "id": generate_uuid(),
+                         "result": [client() for _ in range(20)]},
+        "get_obj_data": {"jsonrpc": "2.0", "id": generate_uuid(), "result": subscriber()},
+        "event": event(),
+    }
+
+
+def measure(codec, payload, number):
+    """
+    Returns:
+        tuple: encoded size in bytes, average encode and decode time in microseconds
+    """
+    body = codec.encode(payload)
+    assert codec.decode(body) == payload
+    encode = timeit.timeit(lambda: codec.encode(payload), number=number) / number * 1e6
+    decode = timeit.timeit(lambda: codec.decode(body), number=number) / number * 1e6
+    return len(body), encode, decode
+
+
+def main(number=NUMBER):
+    print("Codecs, average of {} operations:".format(number))
+    print("    {:<20} {:<20} {:>9} {:>11} {:>11}".format(
+        "payload", "content type", "bytes", "encode us", "decode us"))
+    for name, payload in payloads().items():
+        for content_type, codec in codecs.items():
+            print("    {:<20} {:<20} {:>9} {:>11.1f} {:>11.1f}".format(
+                name, content_type, *measure(codec, payload, number)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark of the per-command overhead of ``ZRedis``.
+
+The connection's ``execute`` is replaced with canned replies, so only the client side cost of a
+command is measured: argument handling, command lookup and response callback. ``LegacyZRedis``
+resolves the command name with ``inspect.stack()`` twice per call, as ``ZRedis`` did before the
+commands were bound to their wire names.
+
+``inspect.stack()`` builds a frame record for every frame on the stack, so its cost grows with the
+depth of the caller. Commands are issued from ``STACK_DEPTH`` nested frames to approximate a call
+made from a falcon resource running under gunicorn.
+
+Usage:
+    python -m zopsm.benchmarks.credis_dispatch [number_of_calls] [stack_depth]
+"""
+import inspect
+import sys
+import timeit
+
+from zopsm.lib.credis import ZRedis
+
+NUMBER_OF_CALLS = 10000
+STACK_DEPTH = 30
+
+REPLIES = {
+    'get': b'value',
+    'exists': 1,
+    'sadd': 1,
+    'smembers': [b'3338423fefdf44029586679981d92ffd', b'31a80814cd274828bfabae9a712411b3'],
+    'hgetall': [b'id', b'16effc7b7be64ce295464a1370a9a2db', b'is_active', b'1'],
+}
+
+
+class CannedReplyMixin(object):
+    def execute(self, command, *args):
+        return REPLIES[command]
+
+
+class DispatchZRedis(CannedReplyMixin, ZRedis):
+    pass
+
+
+class LegacyZRedis(CannedReplyMixin, ZRedis):
+    def who_am_i(self):
+        return inspect.stack()[1][3]
+
+    def get(self, name):
+        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+
+    def exists(self, name):
+        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+
+    def sadd(self, name, *values):
+        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, *values))
+
+    def smembers(self, name):
+        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+
+    def hgetall(self, name):
+        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+
+
+def run_commands(cache, number):
+    for _ in range(number):
+        cache.get('P:1:S:roc:Sub:1')
+        cache.exists('P:1:S:roc:Sub:1')
+        cache.sadd('P:1:S:roc:Sub:1:C', '2')
+        cache.smembers('P:1:S:roc:Sub:1:C')
+        cache.hgetall('P:1:S:roc:Sub:1')
+
+
+def at_depth(depth, func, *args):
+    if depth <= 0:
+        return func(*args)
+    return at_depth(depth - 1, func, *args)
+
+
+def measure(cache, number, depth):
+    """
+    Returns:
+        float: average cost of a single command in microseconds
+    """
+    seconds = timeit.timeit(lambda: at_depth(depth, run_commands, cache, number), number=1)
+    return seconds / (number * len(REPLIES)) * 1e6
+
+
+def main(number=NUMBER_OF_CALLS, depth=STACK_DEPTH):
+    legacy = measure(LegacyZRedis(host='localhost'), number, depth)
+    dispatch = measure(DispatchZRedis(host='localhost'), number, depth)
+    print("Per command overhead at stack depth {}:".format(depth))
+    print("    inspect.stack() lookup: {:8.2f} us".format(legacy))
+    print("    bound dispatch:         {:8.2f} us".format(dispatch))
+    print("    speedup:                {:8.1f}x".format(legacy / dispatch))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,75 @@
+"""
+Throughput benchmark of ``RpcClient`` shared by a growing number of gateway threads.
+
+Calls are made against a ``LocalBroker``, an in-process stand-in of RabbitMQ and the workers,
+whose workers answer after a random latency of 1 to 5 ms. The multiplexed client, which keeps
+any number of calls in flight, is compared with ``SerializedRpcClient``, which allows one call
+at a time as a client keeping a single correlation id has to.
+
+Usage:
+    python -m zopsm.benchmarks.rpc_client [calls_per_thread]
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from zopsm.lib.rest.local_broker import LocalBroker, LocalRpcClient
+
+CALLS_PER_THREAD = 20
+THREAD_COUNTS = (1, 8, 32, 128)
+WORKER_LATENCY = (0.001, 0.005)
+
+
+class SerializedRpcClient(LocalRpcClient):
+    call_lock = threading.Lock()
+
+    def rpc_call(self, *args, **kwargs):
+        with self.call_lock:
+            return super(SerializedRpcClient, self).rpc_call(*args, **kwargs)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def measure(client, threads, calls_per_thread):
+    """
+    Returns:
+        tuple: calls per second, p50 and p99 latency of a call in milliseconds
+    """
+    def calls(thread):
+        latencies = []
+        for call in range(calls_per_thread):
+            start = time.monotonic()
+            client.rpc_call("get_obj_data", {"thread": thread, "call": call})
+            latencies.append((time.monotonic() - start) * 1e3)
+        return latencies
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = [l for thread_latencies in pool.map(calls, range(threads))
+                     for l in thread_latencies]
+    seconds = time.monotonic() - start
+    return len(latencies) / seconds, percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+def main(calls_per_thread=CALLS_PER_THREAD):
+    broker = LocalBroker(latency=WORKER_LATENCY, workers=max(THREAD_COUNTS))
+    serialized, multiplexed = SerializedRpcClient(broker), LocalRpcClient(broker)
+    print("RpcClient.rpc_call, {} calls per thread, worker latency {}-{} ms:".format(
+        calls_per_thread, *[l * 1e3 for l in WORKER_LATENCY]))
+    print("    {:>7} {:>30} {:>30}".format(
+        "threads", "serialized calls/s (p50, p99)", "multiplexed calls/s (p50, p99)"))
+    try:
+        for threads in THREAD_COUNTS:
+            print("    {:>7} {:>12.0f} ({:>6.1f}, {:>6.1f}) {:>12.0f} ({:>6.1f}, {:>6.1f})".format(
+                threads, *measure(serialized, threads, calls_per_thread),
+                *measure(multiplexed, threads, calls_per_thread)))
+    finally:
+        broker.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
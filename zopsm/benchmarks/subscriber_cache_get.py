@@ -0,0 +1,122 @@
+"""
+Benchmark of ``SubscriberCache.get`` for subscribers with a growing number of contacts.
+
+Subscribers with 10, 100 and 1000 contacts, and a tenth as many channels, are written to the
+cache with ``SubscriberCache.set``, then read back from redis with ``SubscriberCache.get_keys``,
+which ``SubscriberCache.get`` uses when the object is not in the local cache of the process, and
+with ``LegacySubscriberCache.get``, which issues its commands one by one as ``SubscriberCache.get``
+did before it was pipelined. Round trips are counted by the client, which serves both the reads
+and the writes as the master.
+
+The benchmark writes to redis db ``BENCHMARK_DB`` of ``REDIS_MASTER`` and flushes it when it
+is done. It imports the cache objects, so it runs with the environment of a service, e.g. in
+the roc container.
+
+Usage:
+    python -m zopsm.benchmarks.subscriber_cache_get [number_of_reads] [redis_db]
+"""
+import os
+import sys
+import timeit
+
+from zopsm.lib.credis import ZRedis
+from zopsm.lib.cache.subscriber_cache import SubscriberCache
+from zopsm.lib.redis_pool import RoutingRedis
+from zopsm.lib.utility import generate_uuid
+
+NUMBER_OF_READS = 100
+BENCHMARK_DB = 15
+CONTACT_COUNTS = (10, 100, 1000)
+
+
+class CountingZRedis(ZRedis):
+    round_trips = 0
+
+    def execute(self, *args):
+        self.round_trips += 1
+        return super(CountingZRedis, self).execute(*args)
+
+    def execute_pipeline(self, *commands):
+        self.round_trips += 1
+        return super(CountingZRedis, self).execute_pipeline(*commands)
+
+
+class LegacySubscriberCache(SubscriberCache):
+    def get(self, default=None):
+        if not self.cache.exists(self.cache_keys['subscriber']):
+            return default
+
+        subscriber = self.parse_hash(self.cache.hgetall(self.cache_keys['subscriber']))
+        for name in ('contacts', 'channels'):
+            subscriber[name] = {}
+            data_key = self.contact_data_key if name == 'contacts' else self.channel_data_key
+            for member in self.cache.smembers(self.cache_keys[name]):
+                subscriber[name][member] = self.cache.hgetall(data_key(member))
+
+        for name in ('banned_channels', 'banned_subscribers', 'channel_invites',
+                     'channel_join_requests', 'contact_requests_in', 'contact_requests_out'):
+            subscriber[name] = self.set_to_list(self.cache.smembers(self.cache_keys[name]))
+
+        for v in self.cache_keys.values():
+            self.cache.expire(v, self.expire)
+
+        return subscriber
+
+
+def subscriber_data(contact_count):
+    return {
+        "last_status_message": "Hello world!",
+        "creation_time": "2017-08-20T08:54:56.750Z00:00",
+        "last_update_time": "2017-08-20T08:54:56.750Z00:00",
+        "is_deleted": False,
+        "is_active": True,
+        "contacts": {generate_uuid(): {"id": generate_uuid()} for _ in range(contact_count)},
+        "channels": {generate_uuid(): {"lastReadMessageId": generate_uuid()}
+                     for _ in range(max(contact_count // 10, 1))},
+        "banned_channels": {generate_uuid(): ""},
+        "banned_subscribers": {generate_uuid(): ""},
+        "channel_invites": {},
+        "channel_join_requests": {},
+        "contact_requests_in": {generate_uuid(): ""},
+        "contact_requests_out": {},
+    }
+
+
+def cache_object(cache_class, client, subscriber_id):
+    subscriber = cache_class('benchmark', 'roc', subscriber_id)
+    subscriber.cache = RoutingRedis(master=client)
+    subscriber.blob_storage = False
+    return subscriber
+
+
+def measure(read, client, number):
+    """
+    Returns:
+        tuple: average duration of a read in milliseconds, round trips of a read
+    """
+    client.round_trips = 0
+    seconds = timeit.timeit(read, number=number)
+    return seconds / number * 1e3, client.round_trips // number
+
+
+def main(number=NUMBER_OF_READS, db=BENCHMARK_DB):
+    client = CountingZRedis(host=os.getenv('REDIS_MASTER', 'localhost'), db=db,
+                            decode_responses=True)
+    print("SubscriberCache.get, average of {} reads:".format(number))
+    print("    {:>8} {:>22} {:>22}".format("contacts", "legacy ms (trips)", "pipelined ms (trips)"))
+    try:
+        for contact_count in CONTACT_COUNTS:
+            subscriber = cache_object(SubscriberCache, client, generate_uuid())
+            subscriber.set(subscriber_data(contact_count))
+
+            legacy = cache_object(LegacySubscriberCache, client, subscriber.object_id)
+            legacy = measure(legacy.get, client, number)
+            pipelined = measure(subscriber.get_keys, client, number)
+            print("    {:>8} {:>15.2f} ({:>4}) {:>15.2f} ({:>4})".format(
+                contact_count, *legacy, *pipelined))
+    finally:
+        client.execute('FLUSHDB')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -5,11 +5,10 @@ from threading import Thread
 
 from zopsm.lib import sd_rabbit
 from zopsm.lib import sd_redis
+from zopsm.lib.codec import get_codec
 from zopsm.log.log_processor import LogProcessor
 from zopsm.lib.log_handler import zlogger
 from zopsm.lib.settings import WORKING_ENVIRONMENT
-from zopsm.lib.credis import ZRedis
-from zopsm.lib.sd_redis import redis_db_pw
 
 EVENT_BIND_LIST = ['{}_logger.INFO.event'.format(WORKING_ENVIRONMENT)]
 EVENT_EXCHANGE = 'log'
@@ -25,7 +24,7 @@ class EventProcessor(LogProcessor):
             ch: Channel
             method: Method
             properties: Props
-            body(dict): Body
+            body(bytes): Body, encoded with the codec of the content type of properties
                 - params(dict): kwargs for methods
                 - method(str): methods name
 
@@ -34,7 +33,7 @@ class EventProcessor(LogProcessor):
         """
 
         try:
-            body = json.loads(body)
+            body = get_codec(properties.content_type).decode(body)
             method_name = body.get('method', None)
             event_worker_method = getattr(self, method_name) if method_name else None
             if event_worker_method is not None:
@@ -55,9 +54,7 @@ class EventProcessor(LogProcessor):
         while not hasattr(sd_rabbit, 'rabbit_nodes') and not hasattr(sd_redis, 'redis_master'):
             time.sleep(0.01)
 
-        self.cache = ZRedis(host=sd_redis.redis_master,
-                            password=redis_db_pw,
-                            db=os.getenv('REDIS_DB'))
+        self.cache = sd_redis.master_client(db=os.getenv('REDIS_DB'))
         self.connection = self.connect()
         self.connection.ioloop.start()
 
@@ -80,7 +77,6 @@ class EventProcessor(LogProcessor):
         """
         exchange = "messages"
         contacts_to_notify_key = kwargs['contacts_to_notify_key']
-        contacts_to_notify = self.cache.smembers(contacts_to_notify_key)
         message = {
             "type": "status_delivery",
             "subscriberId": kwargs['subscriber_id'],
@@ -90,7 +86,7 @@ class EventProcessor(LogProcessor):
             "statusIntentional": kwargs['status_intentional'],
         }
 
-        for contact in contacts_to_notify:
+        for contact in self.cache.sscan_iter(contacts_to_notify_key):
             self.channel.basic_publish(
                 exchange,
                 contact.decode(),
@@ -0,0 +1,173 @@
+from collections import deque
+
+import hiredis
+from credis import ConnectionError as RedisConnectionError
+from credis import AuthenticationError, RedisProtocolError, RedisReplyError
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from tornado.locks import Lock
+from tornado.tcpclient import TCPClient
+
+from zopsm.lib.credis import ZRedis, RedisCommands, bool_ok
+
+READ_CHUNK_SIZE = 65536
+
+
+def pack_command(*args):
+    """
+    Encodes a command in the redis protocol.
+
+    Returns:
+        bytes
+    """
+    output = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            value = arg
+        elif isinstance(arg, int):
+            value = str(int(arg)).encode()
+        elif isinstance(arg, float):
+            value = repr(arg).encode()
+        else:
+            value = str(arg).encode()
+        output.append(b'$%d\r\n%s\r\n' % (len(value), value))
+    return b''.join(output)
+
+
+class AsyncRedis(RedisCommands):
+    """
+    Non-blocking redis client for the tornado IOLoop, with the ``ZRedis`` command surface and
+    response callbacks. Every command returns an awaitable of its parsed reply.
+
+    Commands share a single connection. They are written as soon as they are issued and their
+    replies are matched in order, so commands issued concurrently are pipelined.
+
+    .. code-block:: python
+        channels = await cache.smembers(subscriber_channels_key)
+    """
+
+    def __init__(self, host, password=None, db=0, decode_responses=False, port=6379):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.decode_responses = decode_responses
+        self.response_callbacks = ZRedis.RESPONSE_CALLBACKS.copy()
+
+        self._connection = None  # (host, stream, futures of pending replies)
+        self._connect_lock = Lock()
+
+    def switch_host(self, host):
+        """
+        Sends the following commands to ``host``. Commands already sent to the previous host get
+        their replies from it. Can be called from any thread.
+        """
+        self.host = host
+
+    async def connect(self):
+        """
+        Connects to the current host unless there is an open connection to it.
+
+        Returns:
+            tuple: connection as (host, stream, pending replies)
+        """
+        async with self._connect_lock:
+            if self.is_connected():
+                return self._connection
+            self.disconnect()
+
+            host = self.host
+            try:
+                stream = await TCPClient().connect(host, self.port)
+            except (OSError, StreamClosedError) as e:
+                raise RedisConnectionError(
+                    "Error connecting to ({}:{}). {}.".format(host, self.port, e))
+            connection = (host, stream, deque())
+            IOLoop.current().spawn_callback(self._read_replies, connection)
+
+            if self.password is not None:
+                if not bool_ok(await self._send(connection, ('AUTH', self.password))):
+                    stream.close()
+                    raise AuthenticationError('Invalid Password')
+            if self.db is not None:
+                if not bool_ok(await self._send(connection, ('SELECT', self.db))):
+                    stream.close()
+                    raise RedisConnectionError('Invalid Database')
+
+            self._connection = connection
+            return connection
+
+    def is_connected(self):
+        if self._connection is None:
+            return False
+        host, stream, _ = self._connection
+        return host == self.host and not stream.closed()
+
+    def disconnect(self):
+        if self._connection is not None:
+            self._connection[1].close()
+            self._connection = None
+
+    def _send(self, connection, command):
+        host, stream, pending = connection
+        try:
+            written = stream.write(pack_command(*command))
+        except StreamClosedError as e:
+            raise RedisConnectionError("Connection to {} is closed. {}".format(host, e))
+        # a failed write closes the stream, which fails the pending replies
+        written.add_done_callback(lambda f: f.exception())
+        future = Future()
+        pending.append(future)
+        return future
+
+    async def _read_replies(self, connection):
+        """
+        Reads replies of a connection until it is closed and resolves the pending futures in
+        order.
+        """
+        _, stream, pending = connection
+        kwargs = {
+            'protocolError': RedisProtocolError,
+            'replyError': RedisReplyError,
+        }
+        if self.decode_responses:
+            kwargs['encoding'] = 'utf-8'
+        reader = hiredis.Reader(**kwargs)
+
+        try:
+            while True:
+                reader.feed(await stream.read_bytes(READ_CHUNK_SIZE, partial=True))
+                while True:
+                    reply = reader.gets()
+                    if reply is False:
+                        break
+                    # raises IndexError on a reply which no command waits for
+                    future = pending.popleft()
+                    if future.done():
+                        # cancelled by its caller, e.g. on a timeout
+                        continue
+                    if isinstance(reply, Exception):
+                        future.set_exception(reply)
+                    else:
+                        future.set_result(reply)
+        except Exception as e:
+            # replies can not be matched to their commands any more
+            stream.close()
+            while pending:
+                future = pending.popleft()
+                if not future.done():
+                    future.set_exception(RedisConnectionError(
+                        "Connection to {} is closed. {}".format(self.host, e)))
+
+    async def execute(self, *command):
+        """
+        Sends a command and returns its raw reply.
+        """
+        connection = self._connection if self.is_connected() else await self.connect()
+        return await self._send(connection, command)
+
+    async def dispatch(self, command, *args):
+        response = await self.execute(command, *args)
+        callback = self.response_callbacks.get(command)
+        return callback(response) if callback else response
@@ -0,0 +1,33 @@
+import json
+import zlib
+
+# Version of the encoding, stored as the first byte of a blob. Blobs of other versions are read
+# as cache misses, so the objects are encoded again after the encoding changes.
+BLOB_VERSION = 1
+
+
+def encode_blob(obj):
+    """
+    Encodes a cache object as compressed compact json, prefixed with ``BLOB_VERSION``.
+
+    Args:
+        obj (dict): cache object
+
+    Returns:
+        bytes
+    """
+    data = json.dumps(obj, separators=(',', ':')).encode()
+    return bytes((BLOB_VERSION,)) + zlib.compress(data)
+
+
+def decode_blob(blob):
+    """
+    Args:
+        blob (bytes): value written by ``encode_blob``
+
+    Returns:
+        dict: cache object, None if ``blob`` is empty or of another version
+    """
+    if not blob or blob[0] != BLOB_VERSION:
+        return None
+    return json.loads(zlib.decompress(blob[1:]).decode())
@@ -1,7 +1,18 @@
+import copy
 import os
-from zopsm.lib.credis import ZRedis
+import random
+import threading
+import time
 from zopsm.lib import sd_redis
 from zopsm.lib.log_handler import zlogger
+from zopsm.lib.cache.blob import encode_blob, decode_blob
+from zopsm.lib.cache.local_cache import LocalCache, InvalidationListener
+from zopsm.lib.cache.metrics import metrics, timed
+from zopsm.lib.redis_scripts import scripts, replace_blob_args
+from zopsm.lib.settings import CACHE_INVALIDATION_CHANNEL, CACHE_STORAGE, CACHE_STORAGE_BLOB
+from zopsm.lib.settings import CACHE_LEASE, CACHE_LEASE_TIME, CACHE_LEASE_POLL
+from zopsm.lib.settings import CACHE_EXPIRE_JITTER
+from zopsm.lib.utility import generate_uuid
 
 if os.getenv('REDIS_MASTER'):
     master = os.getenv('REDIS_MASTER')
@@ -9,49 +20,372 @@ else:
     sd_redis.watch_redis(single=True)
     master = sd_redis.redis_master
 
-cache = ZRedis(host=master,
-               password=sd_redis.redis_db_pw,
-               db=os.getenv('REDIS_DB'))
+slave = os.getenv('REDIS_SLAVE') or sd_redis.redis_slave
 
-zlogger.info(f"Connected to redis node: {master}")
+# reads of the cache objects are served by the replica, writes go to the master. Replies are
+# decoded to str while they are parsed.
+cache = sd_redis.router_client(master=master, slave=slave, db=os.getenv('REDIS_DB'),
+                               decode_responses=True)
+# encoded objects of blob storage are read as bytes
+blob_cache = sd_redis.router_client(master=master, slave=slave, db=os.getenv('REDIS_DB'))
+
+zlogger.info(f"Connected to redis nodes, master: {master}, replica: {slave}")
+
+# objects read by the process, served without a round trip to redis until they are rewritten
+local_cache = LocalCache()
+listener = None
+listener_lock = threading.Lock()
+
+# refills in progress in the process, local key of the object: event set when it is refilled
+refills = {}
+refills_lock = threading.Lock()
+
+
+def start_invalidation_listener():
+    """
+    Starts the invalidation listener of the process on first use, so that it runs in the worker
+    processes of gunicorn rather than in the master process.
+    """
+    global listener
+    if listener is not None:
+        return
+    with listener_lock:
+        if listener is None:
+            listener = InvalidationListener(local_cache, lambda: cache.master.host,
+                                            password=sd_redis.redis_db_pw)
+            listener.start()
+
+
+def jitter(expire):
+    """
+    Shortens an expire time by up to ``CACHE_EXPIRE_JITTER`` at random, so that the objects
+    cached together do not expire together.
+
+    Args:
+        expire (int): seconds
+
+    Returns:
+        int: seconds
+    """
+    return int(expire * (1 - random.uniform(0, CACHE_EXPIRE_JITTER)))
 
 
 class Cache(object):
     """
     Base cache object to implement specific cache object for each use case.
 
+    Objects of the classes with ``use_local_cache`` are also kept in the local cache of the
+    process. ``ZRiakObject`` publishes an invalidation whenever it rewrites them, and ``delete``
+    invalidates them wherever it is called from.
+
+    With ``CACHE_STORAGE_BLOB`` storage, an object is stored at ``blob_key`` as a single encoded
+    value, so reading it costs one GET. Only the sets in ``blob_sets``, which are used in set
+    operations on redis, are stored along with it. Blobs expire ``expire`` seconds after they are
+    written, reads do not extend them.
     """
+    use_local_cache = False
+    blob_sets = ()
 
     def __init__(self, project, service, object_id, bucket_name, rpc_client):
         self.cache = cache
+        self.blob_cache = blob_cache
+        self.blob_storage = CACHE_STORAGE == CACHE_STORAGE_BLOB
+        self.blob_key = None
         self.project = project
         self.service = service
         self.object_id = object_id
         self.bucket_name = bucket_name
         self.rpc_client = rpc_client
+        self.local_key = "{}:{}:{}:{}".format(bucket_name, project, service, object_id)
+        self.local_generation = None
 
     def get(self, default=None):
-        raise NotImplemented()
+        raise NotImplementedError()
 
     def set(self, data):
-        raise NotImplemented()
+        raise NotImplementedError()
+
+    def read(self):
+        """
+        Reads the object from the local cache of the process, or from redis and stores it to the
+        local cache.
+
+        Returns:
+            dict: targeted object dict, None if it is not in cache
+        """
+        obj = self.local_get()
+        if obj is not None:
+            self.count('local_hit')
+            return obj
+
+        obj = self.get_blob() if self.blob_storage else self.get_keys()
+        if obj is None:
+            self.count('miss')
+            return None
+
+        self.count('hit')
+        self.local_set(obj)
+        return obj
+
+    def count(self, name, value=1):
+        """
+        Increases the counter ``name`` of the class and project of the object in cache metrics.
+        """
+        metrics.incr(type(self).__name__, self.project, name, value)
+
+    @classmethod
+    def get_many(cls, project, service, object_ids, rpc_client=None):
+        """
+        Retrieves many objects from cache in as many round trips as a single object costs.
+        If `rpc_client` is passed, the objects missed in cache are retrieved from db with a single
+        rpc and set to cache.
+
+        Args:
+            project(str):
+            service(str):
+            object_ids(list): ids of targeted objects
+            rpc_client(RpcClient):
+        Returns:
+            tuple: dict of targeted object dicts by their ids, list of the ids missed in cache.
+            Objects which are not found in db either are not in the dict.
+        """
+        cache_objs = [cls(project, service, object_id, rpc_client=rpc_client)
+                      for object_id in dict.fromkeys(object_ids)]
+        if not cache_objs:
+            return {}, []
+
+        objects = {}
+        unread = []
+        for cache_obj in cache_objs:
+            obj = cache_obj.local_get()
+            if obj is None:
+                unread.append(cache_obj)
+            else:
+                objects[cache_obj.object_id] = obj
+        cache_objs[0].count('local_hit', len(objects))
+
+        if unread:
+            read = cls.get_blobs_many(unread) if unread[0].blob_storage else \
+                cls.get_keys_many(unread)
+            for cache_obj in unread:
+                obj = read[cache_obj.object_id]
+                if obj is not None:
+                    cache_obj.local_set(obj)
+                    objects[cache_obj.object_id] = obj
+
+        missed = [cache_obj for cache_obj in cache_objs if cache_obj.object_id not in objects]
+        cache_objs[0].count('hit', len(unread) - len(missed))
+        cache_objs[0].count('miss', len(missed))
+        if missed and rpc_client is not None:
+            objs_data = missed[0].rpc_many([cache_obj.object_id for cache_obj in missed])
+            for cache_obj in missed:
+                if cache_obj.object_id in objs_data:
+                    objects[cache_obj.object_id] = cache_obj.set(objs_data[cache_obj.object_id])
+
+        return objects, [cache_obj.object_id for cache_obj in missed]
+
+    @classmethod
+    def get_blobs_many(cls, cache_objs):
+        """
+        Reads objects stored in blob storage in a single round trip.
+
+        Args:
+            cache_objs(list): cache objects of the class
+
+        Returns:
+            dict: targeted object dicts by their ids, None for the ones not in cache
+        """
+        with cache_objs[0].blob_cache.pipeline() as pipe:
+            for cache_obj in cache_objs:
+                pipe.get(cache_obj.blob_key)
+            blobs = pipe.execute()
+        return {cache_obj.object_id: decode_blob(blob) for cache_obj, blob in zip(cache_objs, blobs)}
+
+    @classmethod
+    def get_keys_many(cls, cache_objs):
+        raise NotImplementedError()
+
+    def expiring(self, ttl):
+        """
+        Keys stored objects are read from the replica, their expire time is refreshed on the
+        master once half of it has passed, instead of on every read.
+
+        Args:
+            ttl(int): remaining time to live of the object's key, as read with the object
+
+        Returns:
+            bool: whether the expire time of the object's keys is to be refreshed
+        """
+        return ttl < self.expire / 2
+
+    @staticmethod
+    def refresh_expire(expiring):
+        """
+        Sets expire time of the keys of cache objects in a single round trip to the master.
+
+        Args:
+            expiring(list): tuples of cache objects and their keys
+        """
+        if not expiring:
+            return
+        with expiring[0][0].cache.pipeline() as pipe:
+            for cache_obj, keys in expiring:
+                for key in keys:
+                    pipe.expire(key, cache_obj.expire)
+            pipe.execute()
 
     def get_or_set(self, data=None):
         """
         Retrieves data of targeted object from cache if exists in it.
         Otherwise sets the given `data` to cache if any.
-        If no `data` passed, it retrieves the data of channel from db via rpc.
+        If no `data` passed, it retrieves the data of channel from db via rpc, see `refill`.
 
         Args:
             data(dict): targeted object dict
         Returns:
             dict: targeted object dict
         """
-        return self.get() or self.set(data=data or self.rpc())
+        return self.get() or (self.set(data=data) if data else self.refill())
+
+    def refill(self):
+        """
+        Retrieves the data of the missed object via rpc and sets it to cache, once for all callers.
+
+        The threads of a process wait for the one which refills the object. Across processes, the
+        object is refilled by the caller holding its lease in redis, the others read it from cache
+        after it is refilled, from the master so that the refill is not hidden by the lag of the
+        replica. Callers having the object in the local cache return it, even if it is expired,
+        instead of waiting. A lease expires after ``CACHE_LEASE_TIME``, the timeout of the rpc of
+        its holder, so the callers wait as long as it exists and take it over if the refill fails.
+
+        Returns:
+            dict: targeted object dict
+        """
+        with refills_lock:
+            refilled = refills.get(self.local_key)
+            if refilled is None:
+                refilled = refills[self.local_key] = threading.Event()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            stale = self.local_get_stale()
+            if stale is not None:
+                return stale
+            refilled.wait(CACHE_LEASE_TIME)
+            return self.master_get() or self.refill()
+
+        try:
+            return self.leased_refill()
+        finally:
+            with refills_lock:
+                del refills[self.local_key]
+            refilled.set()
+
+    def leased_refill(self):
+        lease = CACHE_LEASE.format(key=self.local_key)
+        token = generate_uuid()
+        if not self.cache.set(lease, token, px=CACHE_LEASE_TIME * 1000, nx=True):
+            stale = self.local_get_stale()
+            if stale is not None:
+                return stale
+            while self.cache.master.exists(lease):
+                time.sleep(CACHE_LEASE_POLL)
+                obj = self.master_get()
+                if obj:
+                    return obj
+            return self.master_get() or self.leased_refill()
+
+        try:
+            return self.set(data=self.rpc())
+        finally:
+            scripts.run(self.cache, 'release_lease', keys=[lease], args=[token])
+
+    def master_get(self):
+        """
+        Reads the object from the redis master, so that an object refilled right before is found.
+
+        Returns:
+            dict: targeted object dict, None if it is not in cache
+        """
+        reader = copy.copy(self)
+        reader.cache, reader.blob_cache = self.cache.master, self.blob_cache.master
+        obj = reader.get_blob() if self.blob_storage else reader.get_keys()
+        if obj is not None:
+            self.local_set(obj)
+        return obj
 
     def delete(self):
-        raise NotImplemented()
+        raise NotImplementedError()
 
+    def local_get(self):
+        """
+        Returns:
+            dict: targeted object dict from the local cache of the process, None if it is not in
+            there
+        """
+        if not self.use_local_cache:
+            return None
+        start_invalidation_listener()
+        self.local_generation = local_cache.generation
+        return local_cache.get(self.local_key)
+
+    def local_get_stale(self):
+        """
+        Returns:
+            dict: targeted object dict from the local cache of the process even if it is expired,
+            None if it is not in there
+        """
+        if not self.use_local_cache:
+            return None
+        obj = local_cache.get(self.local_key, stale=True)
+        if obj is not None:
+            self.count('stale')
+        return obj
+
+    def local_set(self, data):
+        """
+        Stores the object read from redis to the local cache unless it is invalidated after
+        ``local_get``.
+        """
+        if self.use_local_cache and self.local_generation is not None:
+            local_cache.set(self.local_key, data, self.local_generation)
+
+    def invalidate(self):
+        """
+        Removes the object from the local caches of all processes.
+        """
+        local_cache.invalidate(self.local_key)
+        self.cache.publish(CACHE_INVALIDATION_CHANNEL, self.local_key)
+
+    def get_blob(self):
+        """
+        Returns:
+            dict: targeted object dict stored in blob storage, None if it is not in cache
+        """
+        return decode_blob(self.blob_cache.get(self.blob_key))
+
+    def set_blob(self, obj):
+        """
+        Stores the object and its ``blob_sets`` in blob storage in a single round trip.
+
+        Args:
+            obj (dict): targeted object dict
+
+        Returns:
+            dict: ``obj``
+        """
+        keys = [self.blob_key] + [self.cache_keys[name] for name in self.blob_sets]
+        args = replace_blob_args(self.expire, encode_blob(obj),
+                                 [list(obj[name]) for name in self.blob_sets])
+        scripts.run(self.cache, 'replace_blob', keys=keys, args=args)
+        return obj
+
+    def delete_blob(self):
+        self.cache.delete(self.blob_key, *[self.cache_keys[name] for name in self.blob_sets])
+
+    @timed('rpc')
     def rpc(self):
         """
         Makes an rpc call to get raw data of object.
@@ -73,7 +407,42 @@ class Cache(object):
             "object_id": self.object_id,
             "service": self.service,
         }
+        self.count('rpc')
         return self.rpc_client.rpc_call("get_obj_data", params)
 
+    @timed('rpc')
+    def rpc_many(self, object_ids):
+        """
+        Makes a single rpc call to get raw data of many objects of the bucket of this object.
+
+        Args:
+            object_ids(list):
+        Returns:
+            dict: riak_object.data of the found objects by their ids
+        """
+        params = {
+            "bucket_name": self.bucket_name,
+            "project_id": self.project,
+            "object_ids": object_ids,
+            "service": self.service,
+        }
+        self.count('rpc', len(object_ids))
+        return self.rpc_client.rpc_call("get_objs_data", params)
+
     def set_to_list(self, redis_set):
-        return [a.decode() for a in list(redis_set)] if redis_set else []
+        return list(redis_set) if redis_set else []
+
+    def parse_hash(self, redis_hash):
+        """
+        Converts the boolean db default fields of a cached object hash, stored as '1' or '0'.
+
+        Args:
+            redis_hash(dict): reply of hgetall
+
+        Returns:
+            dict: object dict
+        """
+        for field in ('is_deleted', 'is_active'):
+            if field in redis_hash:
+                redis_hash[field] = redis_hash[field] == '1'
+        return redis_hash
@@ -1,6 +1,9 @@
-from zopsm.lib.log_handler import zlogger
+from itertools import islice
+
+from zopsm.lib.redis_scripts import scripts, replace_object_args
 
 from zopsm.lib.settings import CACHE_CHANNELS
+from zopsm.lib.settings import CACHE_CHANNEL_BLOB
 from zopsm.lib.settings import CACHE_CHANNEL_EXPIRE
 from zopsm.lib.settings import CACHE_CHANNEL_MANAGERS
 from zopsm.lib.settings import CACHE_CHANNEL_BANNED_SUBSCRIBERS
@@ -8,17 +11,20 @@ from zopsm.lib.settings import CACHE_CHANNEL_INVITEES
 from zopsm.lib.settings import CACHE_CHANNEL_JOIN_REQUESTS
 from zopsm.lib.settings import CACHE_CHANNEL_SUBSCRIBERS
 from zopsm.lib.settings import CACHE_CHANNEL_OWNERS
-from zopsm.lib.cache.cache import Cache
+from zopsm.lib.cache.cache import Cache, jitter
+from zopsm.lib.cache.metrics import timed
 
 
 class ChannelCache(Cache):
     """
     Cache object for Channel.
     """
+    use_local_cache = True
+    blob_sets = ('subscribers',)
 
     def __init__(self, project, service, channel, rpc_client=None):
         super().__init__(project, service, channel, "channel", rpc_client)
-        self.expire = CACHE_CHANNEL_EXPIRE
+        self.expire = jitter(CACHE_CHANNEL_EXPIRE)
         self.cache_keys = {
             "channel": CACHE_CHANNELS.format(
                 project_id=self.project,
@@ -49,7 +55,12 @@ class ChannelCache(Cache):
                 service=self.service,
                 channel_id=self.object_id),
         }
+        self.blob_key = CACHE_CHANNEL_BLOB.format(
+            project_id=self.project,
+            service=self.service,
+            channel_id=self.object_id)
 
+    @timed('get')
     def get(self, default=None):
         """
 
@@ -92,47 +103,59 @@ class ChannelCache(Cache):
                     "bannedSubscribers": []
                 }
         """
-        if not self.cache.exists(self.cache_keys['channel']):
-            return default
-
-        # todo Evolve to the pipelined version of this code when it is implemented.
-        channel = {}
-        channel_obj_byte = self.cache.hgetall(self.cache_keys['channel'])
-        for k, v in channel_obj_byte.items():
-            if k.decode() in ['is_deleted', 'is_active']:
-                if v.decode() == '1':
-                    value = True
-                else:
-                    value = False
-            else:
-                value = v.decode()
-            channel.update(**{k.decode(): value})
-
-        # read channel's banned subscribers
-        channel['banned_subscribers'] = self.set_to_list(
-            self.cache.smembers(self.cache_keys['banned_subscribers']))
-
-        # read channel's invitees
-        channel['invitees'] = self.set_to_list(self.cache.smembers(self.cache_keys['invitees']))
-
-        # read channel's join requests
-        channel['join_requests'] = self.set_to_list(
-            self.cache.smembers(self.cache_keys['join_requests']))
+        channel = self.read()
+        return default if channel is None else channel
 
-        # read channel's owners
-        channel['owner'] = self.set_to_list(self.cache.smembers(self.cache_keys['owner']))
-
-        # read channel's managers
-        channel['managers'] = self.set_to_list(self.cache.smembers(self.cache_keys['managers']))
-
-        # read channel's subscribers
-        channel['subscribers'] = self.set_to_list(self.cache.smembers(self.cache_keys['subscribers']))
-
-        for v in self.cache_keys.values():
-            self.cache.expire(v, self.expire)
+    def get_keys(self):
+        """
+        Returns:
+            dict: channel object dict stored as a hash and sets, None if it is not in cache
+        """
+        return self.get_keys_many([self])[self.object_id]
 
-        return channel
+    @classmethod
+    def get_keys_many(cls, channels):
+        """
+        Args:
+            channels(list): ChannelCache objects
 
+        Returns:
+            dict: channel object dicts stored as a hash and sets by their ids, None for the ones
+            not in cache
+        """
+        # read channels' hashes, sets and the remaining time to live of their hashes in a single
+        # round trip to the replica. An empty hash means that the channel is not in cache.
+        set_names = [name for name in channels[0].cache_keys if name != 'channel']
+        with channels[0].cache.pipeline() as pipe:
+            for channel in channels:
+                pipe.hgetall(channel.cache_keys['channel'])
+                for name in set_names:
+                    pipe.smembers(channel.cache_keys[name])
+                pipe.ttl(channel.cache_keys['channel'])
+            replies = iter(pipe.execute())
+
+        result = {}
+        expiring = []
+        for channel in channels:
+            channel_hash, *sets, ttl = islice(replies, len(channel.cache_keys) + 1)
+            if not channel_hash:
+                result[channel.object_id] = None
+                continue
+
+            obj = channel.parse_hash(channel_hash)
+            # banned subscribers, invitees, join requests, owners, managers and subscribers of
+            # channel
+            for name, members in zip(set_names, sets):
+                obj[name] = channel.set_to_list(members)
+            result[channel.object_id] = obj
+            if channel.expiring(ttl):
+                expiring.append((channel, channel.cache_keys.values()))
+
+        cls.refresh_expire(expiring)
+
+        return result
+
+    @timed('set')
     def set(self, data):
         """
         Args:
@@ -141,8 +164,6 @@ class ChannelCache(Cache):
         Returns:
             dict: channel object dict as in the same form of the get method's docs.
         """
-        # todo Evolve to the pipelined version of this code when it is implemented.
-        self.delete()
         channel_obj = {
             "id": self.object_id,
             "name": data['name'],
@@ -153,26 +174,28 @@ class ChannelCache(Cache):
             "is_deleted": data['is_deleted'],
             "is_active": data['is_active'],
         }
+        channel_hash = dict(channel_obj)
+
+        set_names = [name for name in self.cache_keys if name != 'channel']
+        for name in set_names:
+            channel_obj[name] = [value for value in data[name].keys()] if data[name] else []
+
+        if self.blob_storage:
+            return self.set_blob(channel_obj)
 
-        # store channel object to redis as a hash map with string fields of it
-        self.cache.hmset(self.cache_keys['channel'], channel_obj)
-        self.cache.expire(self.cache_keys['channel'], self.expire)
-
-        for k, v in self.cache_keys.items():
-            if k != 'channel':
-                channel_obj[k] = [value for value in data[k].keys()] if data[k] else []
-                try:
-                    if channel_obj[k]:
-                        self.cache.sadd(v, *channel_obj[k])
-                except ValueError as e:
-                    zlogger.warning(
-                        "An error occured while trying to add set:{v} to a value:{list_to_add}: "
-                        "{err}".format(v=v, list_to_add=channel_obj[k], err=e))
-                self.cache.expire(v, self.expire)
+        # store channel object to redis as a hash map with string fields of it, and replace the
+        # members of its sets which are changed, in a single round trip
+        keys = [self.cache_keys['channel']] + [self.cache_keys[name] for name in set_names]
+        args = replace_object_args(self.expire, channel_hash,
+                                   [channel_obj[name] for name in set_names])
+        scripts.run(self.cache, 'replace_object', keys=keys, args=args)
 
         return channel_obj
 
+    @timed('delete')
     def delete(self):
-        # todo Evolve to the pipelined version of this code when it is implemented.
-        for key in self.cache_keys.values():
-            self.cache.delete(key)
+        if self.blob_storage:
+            self.delete_blob()
+        else:
+            self.cache.delete(*self.cache_keys.values())
+        self.invalidate()
@@ -0,0 +1,135 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from zopsm.lib.credis import ZRedis
+from zopsm.lib.log_handler import zlogger
+from zopsm.lib.settings import CACHE_LOCAL_MAX_SIZE, CACHE_LOCAL_TTL, CACHE_INVALIDATION_CHANNEL
+
+# seconds to wait before subscribing again after the invalidation channel is lost
+RESUBSCRIBE_WAIT = 1
+
+
+class LocalCache(object):
+    """
+    Size bounded, thread-safe LRU cache of the objects read from redis, kept in the memory of the
+    process. An entry expires ``ttl`` seconds after it is stored.
+
+    Entries are removed by ``invalidate`` when the object is rewritten, which is called by the
+    ``InvalidationListener`` of the process. The cache serves nothing while the listener is not
+    subscribed, since the invalidations published meanwhile would be missed.
+
+    ``generation`` is increased by every invalidation. A value read from redis is only stored if
+    no invalidation happened since the generation was taken, so a read which raced with a write
+    can not keep the old value in the cache.
+    """
+
+    def __init__(self, max_size=CACHE_LOCAL_MAX_SIZE, ttl=CACHE_LOCAL_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self.active = False
+
+        self._entries = OrderedDict()  # key: (expire time, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key, stale=False):
+        """
+        Expired entries are kept until they are invalidated or evicted, they are only returned
+        with ``stale``.
+
+        Args:
+            key (str):
+            stale (bool): whether to return the value even if it is expired
+
+        Returns:
+            object: a copy of the value of ``key``, None if it is not in the cache
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic() and not stale:
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key, value, generation):
+        """
+        Args:
+            key (str):
+            value (object): value read from redis
+            generation (int): ``generation`` of the cache before ``value`` was read
+        """
+        if not self.active or not self.max_size:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self, active=None):
+        """
+        Removes all entries.
+
+        Args:
+            active (bool): whether the cache serves entries afterwards, unchanged if None
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            if active is not None:
+                self.active = active
+
+
+class InvalidationListener(threading.Thread):
+    """
+    Daemon thread which subscribes to ``CACHE_INVALIDATION_CHANNEL`` and invalidates the keys
+    published on it in ``local_cache``. It subscribes again when the connection is lost, e.g.
+    on a master failover, and the cache is cleared in between.
+    """
+
+    def __init__(self, local_cache, get_host, password=None):
+        """
+        Args:
+            local_cache (LocalCache):
+            get_host (callable): returns the address of the redis master
+            password (str):
+        """
+        super().__init__(daemon=True)
+        self.local_cache = local_cache
+        self.get_host = get_host
+        self.password = password
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception as e:
+                zlogger.error("Cache invalidation channel is lost: {}".format(e))
+            self.local_cache.clear(active=False)
+            time.sleep(RESUBSCRIBE_WAIT)
+
+    def listen(self):
+        connection = ZRedis(host=self.get_host(), password=self.password, decode_responses=True)
+        try:
+            connection.send_command(('SUBSCRIBE', CACHE_INVALIDATION_CHANNEL))
+            connection.read_response()
+            self.local_cache.clear(active=True)
+            while True:
+                kind, _, key = connection.read_response()
+                if kind == 'message':
+                    self.local_cache.invalidate(key)
+        finally:
+            connection.disconnect()
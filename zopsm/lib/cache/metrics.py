@@ -0,0 +1,132 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+
+from zopsm.lib.log_handler import zlogger
+from zopsm.lib.settings import CACHE_METRICS_DUMP_INTERVAL
+
+# upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf'))
+
+
+class CacheMetrics(object):
+    """
+    Counters and latency histograms of the cache objects of the process, by cache class and
+    project.
+
+    Counters of the cache objects:
+        - local_hit: object is read from the local cache
+        - hit: object is read from redis
+        - miss: object is not in cache
+        - stale: an expired object is returned from the local cache while it is refilled
+        - rpc: object data is retrieved from db
+
+    Latencies are observed for get, set, delete and rpc. They are dumped to the log every
+    ``dump_interval`` seconds if it is set.
+    """
+
+    def __init__(self, dump_interval=CACHE_METRICS_DUMP_INTERVAL):
+        self.dump_interval = dump_interval
+        self.counters = defaultdict(int)  # (class, project, name): count
+        self.histograms = {}  # (class, project, operation): [bucket counts, count, sum in ms]
+        self.lock = threading.Lock()
+        self.dumper = None
+
+    def incr(self, cache_class, project, name, value=1):
+        with self.lock:
+            self.counters[(cache_class, project, name)] += value
+        self.start_dumper()
+
+    def observe(self, cache_class, project, operation, seconds):
+        ms = seconds * 1e3
+        with self.lock:
+            histogram = self.histograms.get((cache_class, project, operation))
+            if histogram is None:
+                histogram = self.histograms[(cache_class, project, operation)] = [
+                    [0] * len(LATENCY_BUCKETS), 0, 0.0]
+            histogram[0][bisect_left(LATENCY_BUCKETS, ms)] += 1
+            histogram[1] += 1
+            histogram[2] += ms
+        self.start_dumper()
+
+    def snapshot(self, project=None):
+        """
+        Args:
+            project (str): returns only the metrics of ``project`` if it is given
+
+        Returns:
+            dict: metrics in following form
+
+            .. code-block:: python
+                {
+                    "SubscriberCache": {
+                        "0d5d4b7a43a14a1bba7e3b1d9a1f8e8e": {
+                            "counters": {"local_hit": 120, "hit": 30, "miss": 2, "rpc": 2},
+                            "latency": {
+                                "get": {
+                                    "count": 152,
+                                    "sum_ms": 81.3,
+                                    "buckets": {"0.5": 120, "1": 28, "2": 2, ..., "+Inf": 0},
+                                },
+                            },
+                        },
+                    },
+                }
+        """
+        metrics = defaultdict(lambda: defaultdict(lambda: {"counters": {}, "latency": {}}))
+        with self.lock:
+            for (cache_class, project_id, name), value in self.counters.items():
+                if project is not None and project_id != project:
+                    continue
+                metrics[cache_class][project_id]["counters"][name] = value
+            for (cache_class, project_id, operation), histogram in self.histograms.items():
+                if project is not None and project_id != project:
+                    continue
+                buckets, count, total = histogram
+                metrics[cache_class][project_id]["latency"][operation] = {
+                    "count": count,
+                    "sum_ms": round(total, 3),
+                    "buckets": {bucket_label(bound): n for bound, n in zip(LATENCY_BUCKETS, buckets)},
+                }
+        return {cache_class: dict(projects) for cache_class, projects in metrics.items()}
+
+    def start_dumper(self):
+        if not self.dump_interval or self.dumper is not None:
+            return
+        with self.lock:
+            if self.dumper is None:
+                self.dumper = threading.Thread(target=self.dump, daemon=True)
+                self.dumper.start()
+
+    def dump(self):
+        while True:
+            time.sleep(self.dump_interval)
+            zlogger.info("Cache metrics: {}".format(self.snapshot()))
+
+
+def bucket_label(bound):
+    if bound == float('inf'):
+        return "+Inf"
+    return "{:g}".format(bound)
+
+
+def timed(operation):
+    """
+    Decorates a method of a cache object to observe its latency as ``operation``.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.monotonic()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.observe(type(self).__name__, self.project, operation,
+                                time.monotonic() - start)
+        return wrapper
+    return decorator
+
+
+metrics = CacheMetrics()
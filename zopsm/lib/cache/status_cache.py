@@ -1,26 +1,28 @@
-from zopsm.lib.settings import CACHE_ONLINE_SUBSCRIBERS
-from zopsm.lib.settings import CACHE_IDLE_SUBSCRIBERS
+import time
+
+from zopsm.lib.settings import CACHE_PRESENCE
 from zopsm.lib.settings import CACHE_STATUS_EXPIRE
 from zopsm.lib.settings import CACHE_STATUS
 
 from zopsm.lib.cache.cache import Cache
+from zopsm.lib.cache.metrics import timed
 from zopsm.lib.settings import DATETIME_FORMAT
 from datetime import datetime
 
 
 class StatusCache(Cache):
     """
-    Cache object for Channel.
+    Cache object for Status.
+
+    Online and idle subscribers are kept in the presence index of the project, scored by the time
+    of their last status update. Subscribers without a status update in the last ``expire``
+    seconds are offline, their status hashes expire and they are swept from the index.
     """
 
     def __init__(self, project, service, status, rpc_client=None):
         super().__init__(project, service, status, "status", rpc_client)
         self.expire = CACHE_STATUS_EXPIRE
-        self.online_subscribers = CACHE_ONLINE_SUBSCRIBERS.format(
-                project_id=self.project,
-                service=self.service,
-            )
-        self.idle_subscribers = CACHE_IDLE_SUBSCRIBERS.format(
+        self.presence = CACHE_PRESENCE.format(
                 project_id=self.project,
                 service=self.service,
             )
@@ -31,6 +33,7 @@ class StatusCache(Cache):
                 subscriber_id=self.object_id,
             )
 
+    @timed('get')
     def get(self, default=None):
         """
 
@@ -53,27 +56,17 @@ class StatusCache(Cache):
                     "status_intentional": null,
                 },
         """
-        # todo Evolve to the pipelined version of this code when it is implemented.
-        status = {}
-
         # todo: When redis keyspace notifications will be available, it will be activated.
         # if not self.cache.exists(self.status):
             # status['behavioral_status'] = "offline"
             # status.update(self.rpc())
             # return status
 
-        status_obj_byte = self.cache.hgetall(self.status)
-        for k, v in status_obj_byte.items():
-            if k.decode() in ['is_deleted', 'is_active']:
-                if v.decode() == '1':
-                    value = True
-                else:
-                    value = False
-            else:
-                value = v.decode()
-            status[k.decode()] = value
+        status = self.parse_hash(self.cache.hgetall(self.status))
+        self.count('hit' if status else 'miss')
         return status
 
+    @timed('set')
     def set(self, data):
         """
         Args:
@@ -88,7 +81,6 @@ class StatusCache(Cache):
             tuple(dict, bool, bool): status object dict as in the same form of the get method's docs,
                 either True if the status is worth to write into riak and notify user's contacts or False otherwise.
         """
-        # todo Evolve to the pipelined version of this code when it is implemented.
         worth_to_write_and_notify = True
         now = datetime.now().strftime(DATETIME_FORMAT)
         data.update(
@@ -99,32 +91,53 @@ class StatusCache(Cache):
                 "is_active": True,
             }
         )
-        prev_status = {}
-        prev_status_obj_byte = self.cache.hgetall(self.status)
-        for k, v in prev_status_obj_byte.items():
-            if k.decode() in ['is_deleted', 'is_active']:
-                if v.decode() == '1':
-                    value = True
-                else:
-                    value = False
+        # the previous status is read on the master in the transaction of the write, a lagging
+        # replica could miss a change made right before it
+        with self.cache.multi() as pipe:
+            pipe.hgetall(self.status)
+            pipe.delete(self.status)
+            if data['behavioral_status'] != "offline":
+                pipe.hmset(self.status, data)
+                pipe.expire(self.status, self.expire)
+                pipe.zadd(self.presence, {data['subscriber_id']: time.time()})
             else:
-                value = v.decode()
-            prev_status[k.decode()] = value
-
-        self.cache.delete(self.status)
+                pipe.zrem(self.presence, data['subscriber_id'])
+            prev_status = self.parse_hash(pipe.execute()[0])
 
         if data['behavioral_status'] != "offline":
-            self.cache.hmset(self.status, data)
-            if data['behavioral_status'] == "online":
-                self.cache.sadd(self.online_subscribers, data['subscriber_id'])
-                self.cache.srem(self.idle_subscribers, data['subscriber_id'])
-            else:
-                self.cache.sadd(self.idle_subscribers, data['subscriber_id'])
-                self.cache.srem(self.online_subscribers, data['subscriber_id'])
-
             sm = data['status_message'] != prev_status.get('status_message')
             si = data['status_intentional'] != prev_status.get('status_intentional')
             bs = data['behavioral_status'] != prev_status.get('behavioral_status')
             worth_to_write_and_notify = sm or si or bs
 
         return data, worth_to_write_and_notify
+
+    def online_since(self, since):
+        """
+        Args:
+            since (float): unix time
+
+        Returns:
+            list: ids of the subscribers of the project who are online or idle and updated their
+            status since ``since``, in the order of their last update
+        """
+        return self.cache.zrangebyscore(self.presence, since, '+inf')
+
+    def sweep(self):
+        """
+        Removes the subscribers without a status update in the last ``expire`` seconds from the
+        presence index.
+
+        Returns:
+            int: the number of removed subscribers
+        """
+        return self.cache.zremrangebyscore(self.presence, '-inf',
+                                           '({}'.format(presence_since(self.expire)))
+
+
+def presence_since(expire=CACHE_STATUS_EXPIRE):
+    """
+    Returns:
+        float: unix time, subscribers without a status update since then are offline
+    """
+    return time.time() - expire
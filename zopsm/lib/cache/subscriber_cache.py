@@ -1,9 +1,11 @@
 from datetime import datetime
-from zopsm.lib.log_handler import zlogger
-from zopsm.lib.cache.cache import Cache
+from itertools import chain, islice
+from zopsm.lib.cache.cache import Cache, jitter
+from zopsm.lib.cache.metrics import timed
 
 from zopsm.lib.settings import CACHE_SUBSCRIBER_EXPIRE
 from zopsm.lib.settings import CACHE_SUBSCRIBERS
+from zopsm.lib.settings import CACHE_SUBSCRIBER_BLOB
 from zopsm.lib.settings import CACHE_CONTACTS
 from zopsm.lib.settings import CACHE_SUBSCRIBER_CHANNELS
 from zopsm.lib.settings import CACHE_SUBSCRIBER_BANNED_CHANNELS
@@ -50,9 +52,12 @@ class SubscriberCache(Cache):
         contactRequestsOut ->  source='contact_requests_out'
 
     """
+    use_local_cache = True
+    blob_sets = ('contacts', 'channels')
+
     def __init__(self, project, service, subscriber, rpc_client=None):
         super().__init__(project, service, subscriber, "subscriber", rpc_client)
-        self.expire = CACHE_SUBSCRIBER_EXPIRE
+        self.expire = jitter(CACHE_SUBSCRIBER_EXPIRE)
         self.cache_keys = {
             "subscriber": CACHE_SUBSCRIBERS.format(
                 project_id=self.project,
@@ -91,7 +96,12 @@ class SubscriberCache(Cache):
                 service=self.service,
                 subscriber_id=self.object_id),
         }
+        self.blob_key = CACHE_SUBSCRIBER_BLOB.format(
+            project_id=self.project,
+            service=self.service,
+            subscriber_id=self.object_id)
 
+    @timed('get')
     def get(self, default=None):
         """
 
@@ -142,91 +152,102 @@ class SubscriberCache(Cache):
                         ]
                     }
         """
-        if not self.cache.exists(self.cache_keys['subscriber']):
-            return default
-
-        # todo Evolve to the pipelined version of this code when it is implemented.
-        subscriber = {}
-
-        # Read subscriber object's id, last_status_message and db default fields as bytes
-        # Converts them to strings. Some of the db default fields are booleans, they are converted
-        # to booleans in here.
-        subscriber_obj_byte = self.cache.hgetall(self.cache_keys['subscriber'])
-        for k, v in subscriber_obj_byte.items():
-            if k.decode() in ['is_deleted', 'is_active']:
-                if v.decode() == '1':
-                    value = True
-                else:
-                    value = False
-            else:
-                value = v.decode()
-            subscriber.update(**{k.decode(): value})
-
-        # read contacts of subscriber
-        subscriber['contacts'] = {}
-        subs_contact = self.cache.smembers(self.cache_keys['contacts'])
-        for contact_id in subs_contact:
-            decoded_contact_id = contact_id.decode()
-            subscriber["contacts"][decoded_contact_id] = {}
-            contact_cache_data_key = CACHE_SUBSCRIBER_CONTACTS_DATA.format(
-                project_id=self.project,
-                service=self.service,
-                subscriber_id=self.object_id,
-                contact_id=decoded_contact_id
-            )
-            contact_data = self.cache.hgetall(contact_cache_data_key)
-
-            for key, value in contact_data.items():
-                subscriber['contacts'][decoded_contact_id][key.decode()] = value.decode()
-
-        # read channels of subscriber
-        subscriber['channels'] = {}
-
-        subs_channels = self.cache.smembers(self.cache_keys['channels'])
-        for channel_id in subs_channels:
-            decoded_channel_id = channel_id.decode()
-            subscriber["channels"][decoded_channel_id] = {}
-            channel_cache_data_key = CACHE_SUBSCRIBER_CHANNELS_DATA.format(
-                project_id=self.project,
-                service=self.service,
-                subscriber_id=self.object_id,
-                channel_id=decoded_channel_id
-            )
-            channel_data = self.cache.hgetall(channel_cache_data_key)
-
-            for key, value in channel_data.items():
-                subscriber['channels'][decoded_channel_id][key.decode()] = value.decode()
-
-        # read banned channels of subscriber
-        subscriber['banned_channels'] = self.set_to_list(
-            self.cache.smembers(self.cache_keys['banned_channels']))
-
-        # read banned subscribers of subscriber
-        subscriber['banned_subscribers'] = self.set_to_list(
-            self.cache.smembers(self.cache_keys['banned_subscribers']))
+        subscriber = self.read()
+        return default if subscriber is None else subscriber
 
-        # read channel invites of subscriber
-        subscriber['channel_invites'] = self.set_to_list(
-            self.cache.smembers(self.cache_keys['channel_invites']))
-
-        # read channel join requests of subscriber
-        subscriber['channel_join_requests'] = self.set_to_list(
-            self.cache.smembers(self.cache_keys['channel_join_requests']))
-
-        # read incoming contact requests of subscriber
-        subscriber['contact_requests_in'] = self.set_to_list(
-            self.cache.smembers(self.cache_keys['contact_requests_in']))
-
-        # read sent contact requests of subscriber
-        subscriber['contact_requests_out'] = self.set_to_list(
-            self.cache.smembers(self.cache_keys['contact_requests_out']))
-
-        # set expire time for all keys of subscriber
-        for v in self.cache_keys.values():
-            self.cache.expire(v, self.expire)
+    def get_keys(self):
+        """
+        Returns:
+            dict: subscriber object dict stored as hashes and sets, None if it is not in cache
+        """
+        return self.get_keys_many([self])[self.object_id]
 
-        return subscriber
+    @classmethod
+    def get_keys_many(cls, subscribers):
+        """
+        Args:
+            subscribers(list): SubscriberCache objects
 
+        Returns:
+            dict: subscriber object dicts stored as hashes and sets by their ids, None for the ones
+            not in cache
+        """
+        # Round trip 1: read subscriber objects' hashes, their sets and the remaining time to live
+        # of their hashes. An empty hash means that the subscriber is not in cache.
+        set_names = [name for name in subscribers[0].cache_keys if name != 'subscriber']
+        with subscribers[0].cache.pipeline() as pipe:
+            for subscriber in subscribers:
+                pipe.hgetall(subscriber.cache_keys['subscriber'])
+                for name in set_names:
+                    pipe.smembers(subscriber.cache_keys[name])
+                pipe.ttl(subscriber.cache_keys['subscriber'])
+            replies = iter(pipe.execute())
+
+        result = {}
+        found = []
+        for subscriber in subscribers:
+            subscriber_hash, *sets, ttl = islice(replies, len(subscriber.cache_keys) + 1)
+            if not subscriber_hash:
+                result[subscriber.object_id] = None
+                continue
+
+            # Some of the db default fields are booleans, they are converted to booleans in here.
+            obj = subscriber.parse_hash(subscriber_hash)
+            sets = dict(zip(set_names, sets))
+            contact_data_keys = {contact_id: subscriber.contact_data_key(contact_id)
+                                 for contact_id in sets.pop('contacts')}
+            channel_data_keys = {channel_id: subscriber.channel_data_key(channel_id)
+                                 for channel_id in sets.pop('channels')}
+
+            # banned channels, banned subscribers, channel invites, channel join requests,
+            # incoming and sent contact requests of subscriber
+            for name, members in sets.items():
+                obj[name] = subscriber.set_to_list(members)
+            result[subscriber.object_id] = obj
+            found.append((subscriber, obj, contact_data_keys, channel_data_keys, ttl))
+
+        if not found:
+            return result
+
+        # Round trip 2: read the data of contacts and channels of subscribers
+        with subscribers[0].cache.pipeline() as pipe:
+            for _, _, contact_data_keys, channel_data_keys, _ in found:
+                for key in chain(contact_data_keys.values(), channel_data_keys.values()):
+                    pipe.hgetall(key)
+            data = iter(pipe.execute())
+
+        expiring = []
+        for subscriber, obj, contact_data_keys, channel_data_keys, ttl in found:
+            obj['contacts'] = dict(zip(contact_data_keys, data))
+            obj['channels'] = dict(zip(channel_data_keys, data))
+            if subscriber.expiring(ttl):
+                expiring.append((subscriber, list(chain(
+                    subscriber.cache_keys.values(), contact_data_keys.values(),
+                    channel_data_keys.values()))))
+
+        # Round trip 3, to the master: set expire time for all keys of the subscribers whose
+        # expire time is to be refreshed
+        cls.refresh_expire(expiring)
+
+        return result
+
+    def contact_data_key(self, contact_id):
+        return CACHE_SUBSCRIBER_CONTACTS_DATA.format(
+            project_id=self.project,
+            service=self.service,
+            subscriber_id=self.object_id,
+            contact_id=contact_id
+        )
+
+    def channel_data_key(self, channel_id):
+        return CACHE_SUBSCRIBER_CHANNELS_DATA.format(
+            project_id=self.project,
+            service=self.service,
+            subscriber_id=self.object_id,
+            channel_id=channel_id
+        )
+
+    @timed('set')
     def set(self, data):
         """
         Args:
@@ -235,8 +256,21 @@ class SubscriberCache(Cache):
         Returns:
             dict: subscriber object dict as in the same form of the get method's docs.
         """
-        # todo Evolve to the pipelined version of this code when it is implemented.
-        self.delete()
+        if self.blob_storage:
+            subscriber_obj = {
+                "id": self.object_id,
+                "last_status_message": data['last_status_message'],
+                "creation_time": data['creation_time'],
+                "last_update_time": data['last_update_time'],
+                "is_deleted": data['is_deleted'],
+                "is_active": data['is_active'],
+                "contacts": data['contacts'],
+                "channels": data['channels'],
+            }
+            for name in self.cache_keys:
+                if name not in ('subscriber', 'channels', 'contacts'):
+                    subscriber_obj[name] = list(data[name].keys()) if data[name] else []
+            return self.set_blob(subscriber_obj)
 
         subscriber_obj = {
             "id": self.object_id,
@@ -246,78 +280,58 @@ class SubscriberCache(Cache):
             "is_deleted": data['is_deleted'],
             "is_active": data['is_active'],
         }
+        stored_keys = self.stored_keys()
 
-        # store subscriber object to redis as a hash map with string fields of it
-        self.cache.hmset(self.cache_keys['subscriber'], subscriber_obj)
-        self.cache.expire(self.cache_keys['subscriber'], self.expire)
+        # replace the stored keys of the subscriber object in a single round trip
+        with self.cache.multi() as pipe:
+            pipe.delete(*stored_keys)
 
-        for k, v in self.cache_keys.items():
-            if k not in ('subscriber', 'channels', 'contacts'):
-                subscriber_obj[k] = [value for value in data[k].keys()] if data[k] else []
-                try:
+            # store subscriber object to redis as a hash map with string fields of it
+            pipe.hmset(self.cache_keys['subscriber'], subscriber_obj)
+            pipe.expire(self.cache_keys['subscriber'], self.expire)
+
+            for k, v in self.cache_keys.items():
+                if k not in ('subscriber', 'channels', 'contacts'):
+                    subscriber_obj[k] = [value for value in data[k].keys()] if data[k] else []
                     if subscriber_obj[k]:
-                        self.cache.sadd(v, *subscriber_obj[k])
-                except ValueError as e:
-                    zlogger.warning(
-                        "An error occured while trying to add set:{v} to a value:{list_to_add}: "
-                        "{err}".format(v=v, list_to_add=subscriber_obj[k], err=e))
-                self.cache.expire(v, self.expire)
-            elif k == 'channels':
-                subscriber_obj['channels'] = data[k]
-                if data[k]:
-                    self.cache.sadd(v, *data[k].keys())
-                    self.cache.expire(v, self.expire)
-                for channel_id, channel_data in data[k].items():
-                    channel_cache_data_key = CACHE_SUBSCRIBER_CHANNELS_DATA.format(
-                        project_id=self.project,
-                        service=self.service,
-                        subscriber_id=self.object_id,
-                        channel_id=channel_id
-                    )
-                    if channel_data:
-                        for key, value in channel_data.items():
-                            self.cache.hset(channel_cache_data_key, key, value)
-                        self.cache.expire(channel_cache_data_key, self.expire)
-            elif k == 'contacts':
-                subscriber_obj['contacts'] = data[k]
-                if data[k]:
-                    self.cache.sadd(v, *data[k].keys())
-                    self.cache.expire(v, self.expire)
-                for channel_id, channel_data in data[k].items():
-                    contact_cache_data_key = CACHE_SUBSCRIBER_CONTACTS_DATA.format(
-                        project_id=self.project,
-                        service=self.service,
-                        subscriber_id=self.object_id,
-                        contact_id=channel_id
-                    )
-                    if channel_data:
-                        for key, value in channel_data.items():
-                            self.cache.hset(contact_cache_data_key, key, value)
-                        self.cache.expire(contact_cache_data_key, self.expire)
+                        pipe.sadd(v, *subscriber_obj[k])
+                    pipe.expire(v, self.expire)
+                elif k in ('channels', 'contacts'):
+                    subscriber_obj[k] = data[k]
+                    if data[k]:
+                        pipe.sadd(v, *data[k].keys())
+                        pipe.expire(v, self.expire)
+                    data_key = self.channel_data_key if k == 'channels' else \
+                        self.contact_data_key
+                    for member_id, member_data in data[k].items():
+                        if member_data:
+                            pipe.hmset(data_key(member_id), member_data)
+                            pipe.expire(data_key(member_id), self.expire)
+
+            pipe.execute()
 
         return subscriber_obj
 
-    def delete(self):
-        # todo Evolve to the pipelined version of this code when it is implemented.
-        channel_ids = self.cache.smembers(self.cache_keys["channels"])
-        for channel_id in channel_ids:
-            channel_cache_data_key = CACHE_SUBSCRIBER_CHANNELS_DATA.format(
-                project_id=self.project,
-                service=self.service,
-                subscriber_id=self.object_id,
-                channel_id=channel_id.decode()
-            )
-            self.cache.delete(channel_cache_data_key)
-
-        contact_ids = self.cache.smembers(self.cache_keys["contacts"])
-        for contact_id in contact_ids:
-            contact_cache_data_key = CACHE_SUBSCRIBER_CONTACTS_DATA.format(
-                project_id=self.project,
-                service=self.service,
-                subscriber_id=self.object_id,
-                contact_id=contact_id.decode()
-            )
-            self.cache.delete(contact_cache_data_key)
+    def stored_keys(self):
+        """
+        Returns:
+            list: keys of the subscriber object stored as hashes and sets, with the keys of the
+            data of its channels and contacts
+        """
+        # members are read on the master, a lagging replica could miss the keys of new ones
+        with self.cache.master.pipeline() as pipe:
+            pipe.smembers(self.cache_keys["channels"])
+            pipe.smembers(self.cache_keys["contacts"])
+            channel_ids, contact_ids = pipe.execute()
+
+        return list(self.cache_keys.values()) + \
+            [self.channel_data_key(channel_id) for channel_id in channel_ids] + \
+            [self.contact_data_key(contact_id) for contact_id in contact_ids]
 
-        for key in self.cache_keys.values():
-            self.cache.delete(key)
+    @timed('delete')
+    def delete(self):
+        if self.blob_storage:
+            self.delete_blob()
+        else:
+            self.cache.delete(*self.stored_keys())
+        self.invalidate()
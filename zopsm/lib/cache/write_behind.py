@@ -0,0 +1,101 @@
+import atexit
+import copy
+import threading
+from collections import OrderedDict
+
+from zopsm.lib.log_handler import zlogger
+from zopsm.lib.settings import CACHE_WRITE_QUEUE_SIZE, CACHE_WRITE_FLUSH_TIMEOUT
+
+
+class CacheWriter(object):
+    """
+    Writes cache objects to redis in a background thread, so that storing an object to riak does
+    not wait for its cache keys to be rewritten.
+
+    Pending writes are kept per object. A write of an object which is already pending replaces
+    the pending one, so an object stored many times in a row is written to redis once, with its
+    last data. At most ``max_size`` objects are pending, callers wait for a free slot beyond
+    that. Writes are applied by a single thread, in the order the objects were queued.
+
+    Readers see the previous cache entry until the write is applied.
+    """
+
+    def __init__(self, max_size=CACHE_WRITE_QUEUE_SIZE):
+        self.max_size = max_size
+        self._pending = OrderedDict()  # local key of the object: (cache object, data)
+        self._writing = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def set(self, cache_obj, data):
+        """
+        Queues ``cache_obj.set(data)``. ``data`` is copied, so it can be changed afterwards.
+
+        Args:
+            cache_obj (Cache):
+            data (dict): riak object data
+        """
+        self._put(cache_obj, copy.deepcopy(data))
+
+    def delete(self, cache_obj):
+        """
+        Queues ``cache_obj.delete()``.
+        """
+        self._put(cache_obj, None)
+
+    def _put(self, cache_obj, data):
+        with self._condition:
+            self._start()
+            key = cache_obj.local_key
+            while key not in self._pending and len(self._pending) >= self.max_size:
+                self._condition.wait()
+            self._pending[key] = (cache_obj, data)
+            self._condition.notify_all()
+
+    def _start(self):
+        # the thread is started by the first write of the process, it does not survive a fork
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                _, (cache_obj, data) = self._pending.popitem(last=False)
+                self._writing = True
+                self._condition.notify_all()
+            try:
+                self.write(cache_obj, data)
+            except Exception as e:
+                zlogger.error("Cache object {} could not be written: {}".format(
+                    cache_obj.local_key, e))
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    @staticmethod
+    def write(cache_obj, data):
+        if data is None:
+            cache_obj.delete()
+        else:
+            cache_obj.set(data)
+            cache_obj.invalidate()
+
+    def flush(self, timeout=CACHE_WRITE_FLUSH_TIMEOUT):
+        """
+        Waits until the pending writes are applied.
+
+        Returns:
+            bool: False if they are not applied in ``timeout`` seconds
+        """
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                return not self._pending
+            return self._condition.wait_for(lambda: not self._pending and not self._writing,
+                                            timeout)
+
+
+cache_writer = CacheWriter()
+atexit.register(cache_writer.flush)
@@ -0,0 +1,83 @@
+"""
+Codecs of the bodies of the AMQP messages between the services. The codec of a message is named
+by its ``content_type`` property, messages without one are json. A reply is encoded with the
+codec of its request, so a client selects the codec of its calls and of their replies.
+
+msgpack is optional, it is only installed to the services which use ``MSGPACK``. Elsewhere its
+content type is not supported, requests encoded with it are replied with a parse error in json.
+"""
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+
+class CodecError(ValueError):
+    pass
+
+
+class JsonCodec(object):
+    content_type = JSON
+
+    @staticmethod
+    def encode(obj):
+        return json.dumps(obj, ensure_ascii=False).encode()
+
+    @staticmethod
+    def decode(body):
+        try:
+            return json.loads(body.decode() if isinstance(body, bytes) else body)
+        except ValueError as e:
+            raise CodecError(e)
+
+
+class MsgpackCodec(object):
+    """
+    Compact binary codec, e.g. lists of messages are about a sixth smaller, encoded about five
+    times faster and decoded somewhat faster than as json, see ``zopsm.benchmarks.codecs``.
+    Unlike json, it keeps the type of non-string keys of dicts.
+    """
+    content_type = MSGPACK
+
+    @staticmethod
+    def encode(obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def decode(body):
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise CodecError(e)
+
+
+json_codec = JsonCodec()
+codecs = {
+    JSON: json_codec,
+}
+if msgpack is not None:
+    codecs[MSGPACK] = MsgpackCodec()
+
+
+def get_codec(content_type=None):
+    """
+    Args:
+        content_type (str): content type of a message, json if it is None
+
+    Returns:
+        codec of ``content_type``
+
+    Raises:
+        CodecError: if there is no codec of ``content_type``
+    """
+    if not content_type:
+        return json_codec
+    try:
+        return codecs[content_type]
+    except KeyError:
+        raise CodecError("Unsupported content type: {}".format(content_type))
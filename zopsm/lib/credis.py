@@ -1,5 +1,7 @@
-from credis import Connection
-import inspect
+import hiredis
+from credis import Connection, RedisProtocolError, RedisReplyError
+
+from zopsm.lib.settings import REDIS_SCAN_COUNT
 
 
 class DataError(Exception):
@@ -58,43 +60,19 @@ def parse_scan(response, **options):
     return int(cursor), r
 
 
-class ZRedis(Connection):
-    """
-    Custom wrapper for credis
-    """
-    RESPONSE_CALLBACKS = dict_merge(
-        string_keys_to_dict(
-            'exists expire hexists hset hmset sismember setnx renamenx persist',
-            bool
-        ),
-        string_keys_to_dict(
-            'sadd srem del sinterstore sunionstore hdel ttl',
-            int
-        ),
-        string_keys_to_dict(
-            'sdiff sinter smembers sunion',
-            lambda r: r and set(r) or set()
-        ),
-        string_keys_to_dict(
-            'hget hmget spop get', lambda r: r or None
-        ),
-        string_keys_to_dict(
-            'rename', bool_ok
-        ),
-        {
-            'hgetall': lambda r: r and pairs_to_dict(r) or {},
-            'set': lambda r: r and bool_ok(r),
-            'scan': parse_scan,
-        }
+def parse_hscan(response, **options):
+    cursor, r = response
+    return int(cursor), r and pairs_to_dict(r) or {}
 
-    )
 
-    def __init__(self, host, password=None, db=0, *args, **kwargs):
-        super(ZRedis, self).__init__(host=host, password=password, db=db)
-        self.response_callbacks = self.__class__.RESPONSE_CALLBACKS.copy()
+class RedisCommands(object):
+    """
+    Redis commands shared by ``ZRedis`` and its pipelines. Every command hands its wire name and
+    arguments to ``dispatch``, which either executes it or queues it.
+    """
 
-    def who_am_i(self):
-        return inspect.stack()[1][3]
+    def dispatch(self, command, *args):
+        raise NotImplementedError()
 
     # Key Commands
     def set(self, name, value, ex=None, px=None, nx=False, xx=False):
@@ -133,7 +111,7 @@ class ZRedis(Connection):
         if xx:
             pieces.append('xx')
 
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), *pieces))
+        return self.dispatch('set', *pieces)
 
     def setnx(self, name, value):
         """
@@ -146,7 +124,7 @@ class ZRedis(Connection):
         Returns:
             bool
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, value))
+        return self.dispatch('setnx', name, value)
 
     def rename(self, src, dst):
         """
@@ -159,7 +137,7 @@ class ZRedis(Connection):
         Returns:
             bool
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), src, dst))
+        return self.dispatch('rename', src, dst)
 
     def renamenx(self, src, dst):
         """
@@ -172,7 +150,7 @@ class ZRedis(Connection):
         Returns:
             bool
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), src, dst))
+        return self.dispatch('renamenx', src, dst)
 
     def get(self, name):
         """
@@ -184,7 +162,7 @@ class ZRedis(Connection):
         Returns:
 
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+        return self.dispatch('get', name)
 
     def expire(self, name, time):
         """
@@ -198,7 +176,7 @@ class ZRedis(Connection):
         Returns:
             bool
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, time))
+        return self.dispatch('expire', name, time)
 
     def exists(self, name):
         """
@@ -209,7 +187,7 @@ class ZRedis(Connection):
         Returns:
             bool
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+        return self.dispatch('exists', name)
     __contains__ = exists
 
     def delete(self, *names):
@@ -221,7 +199,7 @@ class ZRedis(Connection):
         Returns:
             int: The number of keys that were removed.
         """
-        return self.response_callbacks['del'](self.execute('del', *names))
+        return self.dispatch('del', *names)
 
     def persist(self, name):
         """
@@ -233,7 +211,7 @@ class ZRedis(Connection):
         Returns:
             bool
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+        return self.dispatch('persist', name)
 
     # Hash Commands
     def hgetall(self, name):
@@ -245,7 +223,7 @@ class ZRedis(Connection):
         Returns:
             dict: dict of name/value pairs
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+        return self.dispatch('hgetall', name)
 
     def hexists(self, name, key):
         """
@@ -257,7 +235,7 @@ class ZRedis(Connection):
         Returns:
             bool: indicating if ``key`` exists
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, key))
+        return self.dispatch('hexists', name, key)
 
     def hget(self, name, key):
         """
@@ -269,7 +247,7 @@ class ZRedis(Connection):
         Returns:
             bytes: value of key
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, key))
+        return self.dispatch('hget', name, key)
 
     def hset(self, name, key, value):
         """
@@ -284,8 +262,7 @@ class ZRedis(Connection):
         Returns:
             bool:
         """
-        return self.response_callbacks[self.who_am_i()](
-            self.execute(self.who_am_i(), name, key, value))
+        return self.dispatch('hset', name, key, value)
 
     def hmset(self, name, mapping):
         """
@@ -303,7 +280,7 @@ class ZRedis(Connection):
         items = []
         for pair in iter(mapping.items()):
             items.extend(pair)
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, *items))
+        return self.dispatch('hmset', name, *items)
 
     def hmget(self, name, keys, *args):
         """
@@ -317,7 +294,7 @@ class ZRedis(Connection):
             list:
         """
         args = list_or_args(keys, args)
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, *args))
+        return self.dispatch('hmget', name, *args)
 
     def hincrby(self, name, key, amount=1):
         """
@@ -331,7 +308,7 @@ class ZRedis(Connection):
         Returns:
             int: the value
         """
-        return self.execute(self.who_am_i(), name, key, amount)
+        return self.dispatch('hincrby', name, key, amount)
 
     def hdel(self, name, *keys):
         """
@@ -343,7 +320,7 @@ class ZRedis(Connection):
         Returns:
 
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, *keys))
+        return self.dispatch('hdel', name, *keys)
 
     # Set Commands
     def sadd(self, name, *values):
@@ -358,7 +335,7 @@ class ZRedis(Connection):
         """
         if not values:
             raise ValueError("SADD does not accept empty list as argument!")
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, *values))
+        return self.dispatch('sadd', name, *values)
 
     def sismember(self, name, value):
         """
@@ -371,7 +348,7 @@ class ZRedis(Connection):
         Returns:
             bool:
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, value))
+        return self.dispatch('sismember', name, value)
 
     def smembers(self, name):
         """
@@ -383,7 +360,7 @@ class ZRedis(Connection):
         Returns:
             set:
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+        return self.dispatch('smembers', name)
 
     def spop(self, name):
         """
@@ -395,7 +372,7 @@ class ZRedis(Connection):
         Returns:
             bytes:
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+        return self.dispatch('spop', name)
 
     def srem(self, name, *values):
         """
@@ -409,7 +386,7 @@ class ZRedis(Connection):
             int: the number of members that were removed from the set
 
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name, *values))
+        return self.dispatch('srem', name, *values)
 
     def sinterstore(self, dest, keys, *args):
         """
@@ -422,7 +399,7 @@ class ZRedis(Connection):
         :return:
         """
         args = list_or_args(keys, args)
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), dest, *args))
+        return self.dispatch('sinterstore', dest, *args)
 
     def sunion(self, keys, *args):
         """
@@ -435,7 +412,7 @@ class ZRedis(Connection):
 
         """
         args = list_or_args(keys, args)
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), *args))
+        return self.dispatch('sunion', *args)
 
     def sunionstore(self, dest, keys, *args):
         """
@@ -451,7 +428,7 @@ class ZRedis(Connection):
 
         """
         args = list_or_args(keys, args)
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), dest, *args))
+        return self.dispatch('sunionstore', dest, *args)
 
     def sdiffstore(self, dest, keys, *args):
         """
@@ -467,7 +444,93 @@ class ZRedis(Connection):
 
         """
         args = list_or_args(keys, args)
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), dest, *args))
+        return self.dispatch('sdiffstore', dest, *args)
+
+    # Sorted Set Commands
+    def zadd(self, name, mapping):
+        """
+        Add members with their scores to sorted set ``name``, or update the scores of existing
+        members.
+
+        Args:
+            name (str):
+            mapping (dict): scores of members
+
+        Returns:
+            int: the number of members added
+        """
+        pieces = []
+        for member, score in mapping.items():
+            pieces.extend((score, member))
+        return self.dispatch('zadd', name, *pieces)
+
+    def zrem(self, name, *values):
+        """
+        Remove ``values`` from sorted set ``name``.
+
+        Returns:
+            int: the number of members removed
+        """
+        return self.dispatch('zrem', name, *values)
+
+    def zscore(self, name, value):
+        """
+        Returns:
+            float: the score of ``value`` in sorted set ``name``, None if it is not a member
+        """
+        return self.dispatch('zscore', name, value)
+
+    def zcard(self, name):
+        """
+        Returns:
+            int: the number of members of sorted set ``name``
+        """
+        return self.dispatch('zcard', name)
+
+    def zrangebyscore(self, name, min, max, start=None, num=None):
+        """
+        Return the members of sorted set ``name`` with scores between ``min`` and ``max``, in
+        ascending order of their scores. ``start`` and ``num`` slice the result.
+
+        Args:
+            name (str):
+            min (float): minimum score, or '-inf' or '(' prefixed for an exclusive bound
+            max (float): maximum score, or '+inf' or '(' prefixed for an exclusive bound
+            start (int):
+            num (int):
+
+        Returns:
+            list
+        """
+        if (start is None) != (num is None):
+            raise DataError("``start`` and ``num`` must both be specified")
+        pieces = [name, min, max]
+        if start is not None:
+            pieces.extend(('LIMIT', start, num))
+        return self.dispatch('zrangebyscore', *pieces)
+
+    def zremrangebyscore(self, name, min, max):
+        """
+        Remove the members of sorted set ``name`` with scores between ``min`` and ``max``.
+
+        Returns:
+            int: the number of members removed
+        """
+        return self.dispatch('zremrangebyscore', name, min, max)
+
+    # Pub/Sub Commands
+    def publish(self, channel, message):
+        """
+        Publish ``message`` on ``channel``.
+
+        Args:
+            channel (str):
+            message (str):
+
+        Returns:
+            int: the number of subscribers the message was delivered to
+        """
+        return self.dispatch('publish', channel, message)
 
     # Scan Commands
     def scan(self, cursor=0, match=None, count=None):
@@ -487,7 +550,105 @@ class ZRedis(Connection):
             pieces.extend(['match', match])
         if count is not None:
             pieces.extend(['count', count])
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), *pieces))
+        return self.dispatch('scan', *pieces)
+
+    def sscan(self, name, cursor=0, match=None, count=None):
+        """
+        Incrementally return lists of members of the set ``name``. Also return a cursor
+        indicating the scan position.
+
+        Args:
+            name (str):
+            cursor:
+            match: ``match`` allows for filtering the members by pattern
+            count: ``count`` allows for hint the minimum number of returns
+
+        Returns:
+            tuple: cursor(int), list of members
+        """
+        pieces = [name, cursor]
+        if match is not None:
+            pieces.extend(['match', match])
+        if count is not None:
+            pieces.extend(['count', count])
+        return self.dispatch('sscan', *pieces)
+
+    def hscan(self, name, cursor=0, match=None, count=None):
+        """
+        Incrementally return key/value slices of the hash ``name``. Also return a cursor
+        indicating the scan position.
+
+        Args:
+            name (str):
+            cursor:
+            match: ``match`` allows for filtering the keys by pattern
+            count: ``count`` allows for hint the minimum number of returns
+
+        Returns:
+            tuple: cursor(int), dict of keys and values
+        """
+        pieces = [name, cursor]
+        if match is not None:
+            pieces.extend(['match', match])
+        if count is not None:
+            pieces.extend(['count', count])
+        return self.dispatch('hscan', *pieces)
+
+    # Scan iterators, they hold a single batch of ``count`` elements in memory at a time. An
+    # element which exists during the whole iteration is returned at least once. Elements may be
+    # returned more than once if the set or hash is resized while it is iterated.
+    def scan_iter(self, match=None, count=REDIS_SCAN_COUNT):
+        """
+        Make an iterator using the SCAN command so that the client doesn't need to remember the
+        cursor position.
+
+        Args:
+            match: ``match`` allows for filtering the keys by pattern
+            count: ``count`` allows for hint the minimum number of returns
+
+        Yields:
+            key names
+        """
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = self.scan(cursor=cursor, match=match, count=count)
+            yield from data
+
+    def sscan_iter(self, name, match=None, count=REDIS_SCAN_COUNT):
+        """
+        Make an iterator using the SSCAN command so that the client doesn't need to remember the
+        cursor position.
+
+        Args:
+            name (str):
+            match: ``match`` allows for filtering the members by pattern
+            count: ``count`` allows for hint the minimum number of returns
+
+        Yields:
+            members of the set ``name``
+        """
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = self.sscan(name, cursor=cursor, match=match, count=count)
+            yield from data
+
+    def hscan_iter(self, name, match=None, count=REDIS_SCAN_COUNT):
+        """
+        Make an iterator using the HSCAN command so that the client doesn't need to remember the
+        cursor position.
+
+        Args:
+            name (str):
+            match: ``match`` allows for filtering the keys by pattern
+            count: ``count`` allows for hint the minimum number of returns
+
+        Yields:
+            tuple: key, value pairs of the hash ``name``
+        """
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = self.hscan(name, cursor=cursor, match=match, count=count)
+            yield from data.items()
 
     def ttl(self, name):
         """
@@ -499,4 +660,212 @@ class ZRedis(Connection):
         Returns:
             int
         """
-        return self.response_callbacks[self.who_am_i()](self.execute(self.who_am_i(), name))
+        return self.dispatch('ttl', name)
+
+    # Scripting Commands
+    def evalsha(self, sha, keys, *args):
+        """
+        Runs the cached lua script with the given sha1 digest
+
+        Args:
+            sha (str): sha1 digest of the script
+            keys (list): key names accessed by the script, available as KEYS in lua
+            *args: script arguments, available as ARGV in lua
+
+        Returns:
+            object: reply of the script
+        """
+        return self.dispatch('evalsha', sha, len(keys), *keys, *args)
+
+    def script_load(self, script):
+        """
+        Loads a lua script into the script cache of redis without running it
+
+        Args:
+            script (str): lua source
+
+        Returns:
+            bytes: sha1 digest of the script
+        """
+        return self.dispatch('script', 'load', script)
+
+
+class ZRedis(RedisCommands, Connection):
+    """
+    Custom wrapper for credis
+    """
+    RESPONSE_CALLBACKS = dict_merge(
+        string_keys_to_dict(
+            'exists expire hexists hset hmset sismember setnx renamenx persist',
+            bool
+        ),
+        string_keys_to_dict(
+            'sadd srem del sinterstore sunionstore sdiffstore hdel ttl publish zadd zrem zcard '
+            'zremrangebyscore',
+            int
+        ),
+        string_keys_to_dict(
+            'sdiff sinter smembers sunion',
+            lambda r: r and set(r) or set()
+        ),
+        string_keys_to_dict(
+            'hget hmget spop get', lambda r: r or None
+        ),
+        string_keys_to_dict(
+            'rename', bool_ok
+        ),
+        {
+            'hgetall': lambda r: r and pairs_to_dict(r) or {},
+            'set': lambda r: r and bool_ok(r),
+            'scan': parse_scan,
+            'sscan': parse_scan,
+            'hscan': parse_hscan,
+            'zscore': lambda r: float(r) if r is not None else None,
+        }
+
+    )
+
+    def __init__(self, host, password=None, db=0, decode_responses=False, *args, **kwargs):
+        """
+        Args:
+            host (str):
+            password (str):
+            db (int):
+            decode_responses (bool): when True, replies are decoded to str by the reply parser,
+            including members of hash and set replies, instead of being returned as bytes
+        """
+        super(ZRedis, self).__init__(host=host, password=password, db=db)
+        self.decode_responses = decode_responses
+        self.response_callbacks = self.__class__.RESPONSE_CALLBACKS.copy()
+
+    def connect(self):
+        """
+        Connects to redis. With ``decode_responses``, the reply parser is swapped for a decoding
+        one after the connection is set up, since credis checks the AUTH and SELECT replies
+        as bytes.
+        """
+        if self._sock:
+            return
+        super(ZRedis, self).connect()
+        if self.decode_responses:
+            self._reader = hiredis.Reader(protocolError=RedisProtocolError,
+                                          replyError=RedisReplyError,
+                                          encoding='utf-8')
+
+    def dispatch(self, command, *args):
+        """
+        Sends ``command`` to redis and passes its reply through the response callback bound to
+        ``command``. Commands without a callback return the raw reply.
+
+        Args:
+            command (str): wire name of the redis command, also the key of its response callback
+            *args: command arguments
+
+        Returns:
+            object: parsed reply
+        """
+        response = self.execute(command, *args)
+        callback = self.response_callbacks.get(command)
+        return callback(response) if callback else response
+
+    def pipeline(self, transaction=False):
+        """
+        Returns a pipeline which queues commands and sends them to redis in a single write.
+
+        .. code-block:: python
+            with cache.pipeline() as pipe:
+                pipe.hgetall(subscriber_key)
+                pipe.smembers(contacts_key)
+                subscriber, contacts = pipe.execute()
+
+        Args:
+            transaction (bool): wraps the queued commands with MULTI/EXEC when True
+
+        Returns:
+            Pipeline
+        """
+        return Pipeline(self, transaction=transaction)
+
+    def multi(self):
+        """
+        Returns a pipeline whose commands are executed atomically inside MULTI/EXEC.
+
+        Returns:
+            Pipeline
+        """
+        return self.pipeline(transaction=True)
+
+
+class Pipeline(RedisCommands):
+    """
+    Queues commands of a ``ZRedis`` connection and sends them in one round trip when ``execute``
+    is called. Replies are passed through the connection's response callbacks and returned in the
+    order the commands were queued.
+    """
+
+    def __init__(self, connection, transaction=False):
+        self.connection = connection
+        self.response_callbacks = connection.response_callbacks
+        self.transaction = transaction
+        self.command_stack = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.reset()
+
+    def __len__(self):
+        return len(self.command_stack)
+
+    def reset(self):
+        self.command_stack = []
+
+    def dispatch(self, command, *args):
+        """
+        Queues ``command`` instead of executing it.
+
+        Returns:
+            Pipeline: itself, so that commands can be chained
+        """
+        self.command_stack.append((command,) + args)
+        return self
+
+    def execute(self, raise_on_error=True):
+        """
+        Sends all queued commands to redis and empties the queue.
+
+        Args:
+            raise_on_error (bool): raises the first failed command's error when True, otherwise
+            the error is returned in place of that command's result
+
+        Returns:
+            list: parsed replies in the order of the queued commands
+        """
+        stack = self.command_stack
+        if not stack:
+            return []
+        self.reset()
+
+        if self.transaction:
+            replies = self.connection.execute_pipeline(('MULTI',), *stack, ('EXEC',))
+            exec_reply = replies[-1]
+            if isinstance(exec_reply, Exception):
+                # EXECABORT hides the reason, raise the error of the command which was rejected
+                for reply in replies[1:-1]:
+                    if isinstance(reply, Exception):
+                        raise reply
+                raise exec_reply
+            replies = exec_reply
+        else:
+            replies = self.connection.execute_pipeline(*stack)
+
+        results = []
+        for command, reply in zip(stack, replies):
+            if not isinstance(reply, Exception):
+                callback = self.response_callbacks.get(command[0])
+                reply = callback(reply) if callback else reply
+            elif raise_on_error:
+                raise reply
+            results.append(reply)
+        return results
@@ -0,0 +1,362 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from credis import ConnectionError as RedisConnectionError
+from credis import RedisReplyError
+
+from zopsm.lib.credis import ZRedis, RedisCommands, Pipeline
+from zopsm.lib.settings import REDIS_POOL_MAX_CONNECTIONS
+from zopsm.lib.settings import REDIS_POOL_TIMEOUT
+from zopsm.lib.settings import REDIS_POOL_HEALTH_CHECK_INTERVAL
+from zopsm.lib.settings import REDIS_FAILOVER_WAIT
+
+
+class PoolTimeoutError(RedisConnectionError):
+    pass
+
+
+class ConnectionPool(object):
+    """
+    Bounded, thread-safe pool of ``ZRedis`` connections to a single redis node.
+
+    Connections are created lazily up to ``max_connections``. When all of them are in use, callers
+    wait up to ``timeout`` seconds for one to be released. A connection which has been idle longer
+    than ``health_check_interval`` seconds is pinged before it is handed out, and reconnected if
+    the ping fails.
+    """
+
+    def __init__(self, host, password=None, db=0, decode_responses=False,
+                 max_connections=REDIS_POOL_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT,
+                 health_check_interval=REDIS_POOL_HEALTH_CHECK_INTERVAL):
+        self.host = host
+        self.password = password
+        self.db = db
+        self.decode_responses = decode_responses
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._condition = threading.Condition()
+        self._idle = []  # (connection, last release time) pairs, most recently used last
+        self._created = 0
+        self._generation = 0
+
+    def __repr__(self):
+        return "ConnectionPool<host={}, db={}>".format(self.host, self.db)
+
+    def make_connection(self):
+        return ZRedis(host=self.host, password=self.password, db=self.db,
+                      decode_responses=self.decode_responses)
+
+    def get_connection(self):
+        """
+        Returns an idle connection, creates a new one if the pool is not full, or waits for one
+        to be released.
+
+        Raises:
+            PoolTimeoutError: no connection was released within ``timeout`` seconds
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._created < self.max_connections:
+                    self._created += 1
+                    connection, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        "No free connection in {} after {} seconds".format(self, self.timeout))
+                self._condition.wait(remaining)
+            generation = self._generation
+
+        if connection is None:
+            try:
+                connection = self.make_connection()
+                # connected before it is handed out, so that a command sent over it is known to
+                # reach a reachable host
+                connection.connect()
+            except Exception:
+                self._discard()
+                raise
+        elif time.monotonic() - last_used > self.health_check_interval:
+            try:
+                self.check_health(connection)
+            except Exception:
+                connection.disconnect()
+                self._discard()
+                raise
+
+        connection.pool_generation = generation
+        return connection
+
+    def check_health(self, connection):
+        """
+        Pings the connection and reconnects it once if the ping fails.
+        """
+        try:
+            connection.execute('PING')
+        except (RedisConnectionError, RedisReplyError):
+            connection.disconnect()
+            connection.execute('PING')
+
+    def release(self, connection):
+        """
+        Returns the connection to the pool. Connections handed out before the last ``disconnect``
+        are closed instead.
+        """
+        with self._condition:
+            if connection.pool_generation == self._generation:
+                self._idle.append((connection, time.monotonic()))
+                self._condition.notify()
+                return
+        connection.disconnect()
+        self._discard()
+
+    def _discard(self):
+        with self._condition:
+            self._created -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        connection = self.get_connection()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def disconnect(self):
+        """
+        Closes idle connections. Connections which are in use are closed when they are released.
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._generation += 1
+            self._condition.notify_all()
+
+        for connection, _ in idle:
+            connection.disconnect()
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(host, password=None, db=0, decode_responses=False, role='master'):
+    """
+    Returns the process wide connection pool of the (host, db) pair. Connections decoding their
+    replies, authenticating with another password or serving another role are pooled separately,
+    so that the clients of a master and of a replica never share a pool when the nodes swap roles
+    in a failover.
+    """
+    key = (role, host, password, db, decode_responses)
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = ConnectionPool(host, password=password, db=db,
+                                               decode_responses=decode_responses)
+        return pool
+
+
+class PooledRedis(RedisCommands):
+    """
+    Thread-safe redis client with the ``ZRedis`` command surface. Each command borrows a
+    connection from the pool of the current host and returns it right after the reply is read.
+
+    When the host is switched with ``switch_host``, commands which did not reach the old host,
+    because no connection to it could be made or it replied READONLY, are retried once on the new
+    one. Such a command waits up to ``failover_wait`` seconds for a switch before raising, so that
+    callers do not see the errors of the gap between a master failing and its replacement being
+    announced. Commands whose connection is lost after they are sent are not retried, they may
+    have been applied.
+
+    ``role`` names the node the client follows, 'master' or 'replica'. Clients of different roles
+    use separate pools, so that switching one of them does not close the connections of the other.
+    """
+
+    def __init__(self, host, password=None, db=0, decode_responses=False,
+                 failover_wait=REDIS_FAILOVER_WAIT, role='master'):
+        self.password = password
+        self.db = db
+        self.decode_responses = decode_responses
+        self.failover_wait = failover_wait
+        self.role = role
+        self.response_callbacks = ZRedis.RESPONSE_CALLBACKS.copy()
+        self.pool = get_pool(host, password=password, db=db, decode_responses=decode_responses,
+                             role=role)
+        self._switched = threading.Condition()
+
+    @property
+    def host(self):
+        return self.pool.host
+
+    def switch_host(self, host):
+        """
+        Sends the following commands to ``host`` and closes the connections to the previous one.
+        """
+        with self._switched:
+            old_pool = self.pool
+            if old_pool.host == host:
+                return
+            self.pool = get_pool(host, password=self.password, db=self.db,
+                                 decode_responses=self.decode_responses, role=self.role)
+            self._switched.notify_all()
+        old_pool.disconnect()
+
+    def wait_for_switch(self, pool):
+        with self._switched:
+            return self._switched.wait_for(lambda: self.pool is not pool, self.failover_wait)
+
+    def call(self, method, *args):
+        """
+        Runs ``method`` of a pooled connection with ``args``, retrying once on a new host if it
+        did not reach the current one.
+        """
+        pool = self.pool
+        try:
+            connection = pool.get_connection()
+        except PoolTimeoutError:
+            raise
+        except (RedisConnectionError, RedisReplyError) as e:
+            # connecting or the health check failed, the command is not sent
+            error = e
+        else:
+            try:
+                return getattr(connection, method)(*args)
+            except RedisReplyError as e:
+                if not str(e).startswith('READONLY'):
+                    raise
+                error = e
+            finally:
+                pool.release(connection)
+
+        if not self.wait_for_switch(pool):
+            raise error
+
+        with self.pool.connection() as connection:
+            return getattr(connection, method)(*args)
+
+    def dispatch(self, command, *args):
+        return self.call('dispatch', command, *args)
+
+    def execute(self, *args):
+        return self.call('execute', *args)
+
+    def execute_pipeline(self, *commands):
+        return self.call('execute_pipeline', *commands)
+
+    def pipeline(self, transaction=False):
+        """
+        Returns a pipeline which sends its commands over a single pooled connection.
+
+        Returns:
+            Pipeline
+        """
+        return Pipeline(self, transaction=transaction)
+
+    def multi(self):
+        return self.pipeline(transaction=True)
+
+
+# read-only commands served by replicas
+REPLICA_COMMANDS = frozenset(['hgetall', 'smembers', 'sismember', 'exists', 'hmget', 'sunion',
+                              'sscan', 'hscan', 'zscore', 'zcard', 'zrangebyscore', 'ttl'])
+
+
+class RoutingRedis(RedisCommands):
+    """
+    Redis client which sends the read-only commands in ``replica_commands`` to a replica and every
+    other command to the master. A pipeline goes to the replica only if all of its commands are
+    read-only. Reads fall back to the master when the replica is unreachable.
+
+    Replicas lag behind the master, so a read issued right after a write may not see it. Callers
+    which must read their own writes open a session with ``session(read_your_writes=True)``.
+    """
+
+    def __init__(self, master, replica=None, replica_commands=REPLICA_COMMANDS):
+        self.master = master
+        self.replica = replica
+        self.replica_commands = replica_commands
+        self.response_callbacks = master.response_callbacks
+
+    def route(self, commands):
+        """
+        Args:
+            commands (list): commands to be sent together, each as a (name, *args) tuple
+
+        Returns:
+            PooledRedis: client of the node which will serve the commands
+        """
+        if self.replica is not None and all(c[0] in self.replica_commands for c in commands):
+            return self.replica
+        return self.master
+
+    def call(self, method, commands, *args):
+        client = self.route(commands)
+        if client is self.master:
+            return getattr(client, method)(*args)
+        try:
+            return getattr(client, method)(*args)
+        except RedisConnectionError:
+            return getattr(self.master, method)(*args)
+
+    def dispatch(self, command, *args):
+        return self.call('dispatch', [(command,)], command, *args)
+
+    def execute(self, *args):
+        return self.master.execute(*args)
+
+    def execute_pipeline(self, *commands):
+        return self.call('execute_pipeline', commands, *commands)
+
+    def pipeline(self, transaction=False):
+        return Pipeline(self, transaction=transaction)
+
+    def multi(self):
+        return self.pipeline(transaction=True)
+
+    def session(self, read_your_writes=False):
+        """
+        Returns:
+            RoutingSession
+        """
+        return RoutingSession(self, read_your_writes=read_your_writes)
+
+
+class RoutingSession(RoutingRedis):
+    """
+    Routing client of a single unit of work such as one request. With ``read_your_writes``, once
+    a command of the session is sent to the master, the following reads are sent there too.
+
+    A session keeps state, so it must not be shared between threads.
+
+    .. code-block:: python
+        with cache.session(read_your_writes=True) as session:
+            session.sadd(contacts_key, contact_id)
+            session.smembers(contacts_key)  # served by the master
+    """
+
+    def __init__(self, router, read_your_writes=False):
+        super().__init__(router.master, router.replica, router.replica_commands)
+        self.read_your_writes = read_your_writes
+        self.written = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.written = False
+
+    def route(self, commands):
+        if self.written:
+            return self.master
+        client = super().route(commands)
+        if client is self.master and self.read_your_writes:
+            self.written = True
+        return client
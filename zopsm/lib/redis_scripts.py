@@ -0,0 +1,336 @@
+from hashlib import sha1
+
+from credis import RedisReplyError
+
+from zopsm.lib.credis import pairs_to_dict
+
+
+class ScriptRegistry(object):
+    """
+    Registry of named lua scripts which run multi step redis operations atomically in a single
+    round trip.
+
+    Scripts are called with EVALSHA. If the node does not know a script yet, e.g. right after a
+    restart or a master failover, it is loaded with SCRIPT LOAD and called again.
+
+    .. code-block:: python
+        user_info = scripts.run(cache, 'rotate_tokens', keys=[CACHE_TOKENS_KEYS],
+                                args=[refresh_token, ...])
+    """
+
+    def __init__(self):
+        self.scripts = {}
+
+    def register(self, name, source):
+        """
+        Args:
+            name (str): name to run the script with
+            source (str): lua source of the script
+        """
+        self.scripts[name] = (source, sha1(source.encode()).hexdigest())
+
+    def load(self, client):
+        """
+        Loads all registered scripts to the node of ``client`` ahead of their first call.
+        """
+        for source, _ in self.scripts.values():
+            client.script_load(source)
+
+    def run(self, client, name, keys=(), args=()):
+        """
+        Args:
+            client (ZRedis): connection or pooled client to run the script with
+            name (str): name of a registered script
+            keys (list): key names accessed by the script, available as KEYS in lua
+            args (list): script arguments, available as ARGV in lua
+
+        Returns:
+            object: reply of the script
+        """
+        source, sha = self.scripts[name]
+        try:
+            return client.evalsha(sha, keys, *args)
+        except RedisReplyError as e:
+            if not str(e).startswith('NOSCRIPT'):
+                raise
+        client.script_load(source)
+        return client.evalsha(sha, keys, *args)
+
+
+scripts = ScriptRegistry()
+
+
+# Formats the key templates of settings, e.g. "P:{project_id}:S:{service}:AccTok:{token}", in lua.
+FORMAT_KEY = """
+local function format_key(template, values)
+    return (string.gsub(template, '{([%w_]+)}', values))
+end
+"""
+
+# Rotates the access and refresh tokens of a refresh token.
+#
+# KEYS[1]: tokens keys hash, maps tokens to their redis keys
+# ARGV[1]: refresh token to rotate
+# ARGV[2]: new refresh token
+# ARGV[3]: new access token
+# ARGV[4]: expire time of the new access token
+# ARGV[5], ARGV[6], ARGV[7]: key templates of refresh tokens, access tokens and token lists
+#
+# Returns the user info of the refresh token as a flat list of field value pairs, an empty list
+# if the refresh token is unknown.
+scripts.register('rotate_tokens', FORMAT_KEY + """
+local tokens_keys = KEYS[1]
+local refresh_token, new_refresh_token, new_access_token = ARGV[1], ARGV[2], ARGV[3]
+
+local refresh_token_key = redis.call('HGET', tokens_keys, refresh_token)
+if not refresh_token_key then
+    return {}
+end
+local fields = redis.call('HGETALL', refresh_token_key)
+if #fields == 0 then
+    return {}
+end
+
+local user_info, access_info = {}, {}
+for i = 1, #fields, 2 do
+    user_info[fields[i]] = fields[i + 1]
+    if fields[i] ~= 'access_token' then
+        table.insert(access_info, fields[i])
+        table.insert(access_info, fields[i + 1])
+    end
+end
+
+local values = {project_id = user_info['project'], service = user_info['service']}
+values['token'] = new_refresh_token
+local new_refresh_token_key = format_key(ARGV[5], values)
+values['token'] = new_access_token
+local new_access_token_key = format_key(ARGV[6], values)
+local service_tokens_key = format_key(ARGV[7], values)
+
+-- delete old access token
+if user_info['access_token'] then
+    local access_token_key = redis.call('HGET', tokens_keys, user_info['access_token'])
+    if access_token_key then
+        redis.call('DEL', access_token_key)
+    end
+    redis.call('HDEL', tokens_keys, user_info['access_token'])
+end
+
+redis.call('SADD', service_tokens_key, new_access_token, new_refresh_token)
+
+-- set the new access token
+if #access_info > 0 then
+    redis.call('HMSET', new_access_token_key, unpack(access_info))
+end
+redis.call('HSET', tokens_keys, new_access_token, new_access_token_key)
+redis.call('EXPIRE', new_access_token_key, ARGV[4])
+
+-- set the new refresh token, paired with the new access token
+table.insert(access_info, 'access_token')
+table.insert(access_info, new_access_token)
+redis.call('HMSET', new_refresh_token_key, unpack(access_info))
+redis.call('HSET', tokens_keys, new_refresh_token, new_refresh_token_key)
+
+-- remove the old refresh token
+redis.call('DEL', refresh_token_key)
+redis.call('HDEL', tokens_keys, refresh_token)
+
+return fields
+""")
+
+# Sweeps the subscribers without activity since a given time from the presence index, which is
+# O(log n) in its size plus the number of removed members.
+SWEEP_PRESENCE = """
+local function sweep_presence(presence, since)
+    redis.call('ZREMRANGEBYSCORE', presence, '-inf', '(' .. since)
+end
+"""
+
+# Reads the statuses of a subscriber's contacts which are online or idle, after sweeping the
+# presence index.
+#
+# KEYS[1]: presence index
+# KEYS[2]: contacts set of the subscriber
+# ARGV[1]: key template of statuses
+# ARGV[2]: project id
+# ARGV[3]: service
+# ARGV[4]: unix time, subscribers without activity since then are offline
+#
+# Returns a flat list of contact id, status field value pairs couples. Contacts without a status
+# hash are skipped.
+scripts.register('contact_statuses', FORMAT_KEY + SWEEP_PRESENCE + """
+sweep_presence(KEYS[1], ARGV[4])
+local values = {project_id = ARGV[2], service = ARGV[3]}
+local result = {}
+for _, contact in ipairs(redis.call('SMEMBERS', KEYS[2])) do
+    if redis.call('ZSCORE', KEYS[1], contact) then
+        values['subscriber_id'] = contact
+        local status = redis.call('HGETALL', format_key(ARGV[1], values))
+        if #status > 0 then
+            table.insert(result, contact)
+            table.insert(result, status)
+        end
+    end
+end
+return result
+""")
+
+# Stores the contacts of a subscriber which are online or idle into the key read by the event
+# processor, after sweeping the presence index.
+#
+# KEYS[1]: contacts set of the subscriber
+# KEYS[2]: presence index
+# KEYS[3]: contacts to notify set
+# ARGV[1]: unix time, subscribers without activity since then are offline
+#
+# Returns the number of contacts to notify.
+scripts.register('contacts_to_notify', SWEEP_PRESENCE + """
+sweep_presence(KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[3])
+local present = {}
+for _, contact in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if redis.call('ZSCORE', KEYS[2], contact) then
+        table.insert(present, contact)
+    end
+end
+for i = 1, #present, 1000 do
+    redis.call('SADD', KEYS[3], unpack(present, i, math.min(i + 999, #present)))
+end
+return #present
+""")
+
+# Deletes a lease unless it is expired and taken by another holder meanwhile.
+#
+# KEYS[1]: lease
+# ARGV[1]: token of the holder
+scripts.register('release_lease', """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+# Replaces the members of the sets KEYS[first_key..n] with the members in ARGV starting at ARGV[i],
+# given as the number of members of a set followed by its members. A set is only changed by the
+# members which are removed from or added to it, so an unchanged set costs no writes.
+REPLACE_SETS = """
+local function chunked(command, key, members)
+    for i = 1, #members, 1000 do
+        redis.call(command, key, unpack(members, i, math.min(i + 999, #members)))
+    end
+end
+
+local function replace_sets(first_key, i, expire)
+    for k = first_key, #KEYS do
+        local count = tonumber(ARGV[i])
+        local members, current = {}, {}
+        for j = i + 1, i + count do
+            members[ARGV[j]] = true
+        end
+
+        local removed = {}
+        for _, member in ipairs(redis.call('SMEMBERS', KEYS[k])) do
+            current[member] = true
+            if not members[member] then
+                table.insert(removed, member)
+            end
+        end
+        local added = {}
+        for j = i + 1, i + count do
+            if not current[ARGV[j]] then
+                current[ARGV[j]] = true
+                table.insert(added, ARGV[j])
+            end
+        end
+
+        chunked('SREM', KEYS[k], removed)
+        chunked('SADD', KEYS[k], added)
+        redis.call('EXPIRE', KEYS[k], expire)
+        i = i + count + 1
+    end
+end
+"""
+
+# Replaces the hash and the sets of a cached object.
+#
+# KEYS[1]: hash of the object
+# KEYS[2..n]: sets of the object
+# ARGV[1]: expire time of the keys
+# ARGV[2]: number of the hash field value args following it
+# the hash field value pairs, then for every set, number of its members followed by the members
+scripts.register('replace_object', REPLACE_SETS + """
+local expire = ARGV[1]
+local i = 2
+local arg_count = tonumber(ARGV[i])
+redis.call('DEL', KEYS[1])
+if arg_count > 0 then
+    redis.call('HMSET', KEYS[1], unpack(ARGV, i + 1, i + arg_count))
+    redis.call('EXPIRE', KEYS[1], expire)
+end
+replace_sets(2, i + arg_count + 1, expire)
+""")
+
+# Replaces the encoded value and the sets of a cached object.
+#
+# KEYS[1]: encoded object
+# KEYS[2..n]: sets of the object
+# ARGV[1]: expire time of the keys
+# ARGV[2]: encoded object
+# then for every set, number of its members followed by the members
+scripts.register('replace_blob', REPLACE_SETS + """
+local expire = ARGV[1]
+redis.call('SET', KEYS[1], ARGV[2], 'EX', expire)
+replace_sets(2, 3, expire)
+""")
+
+
+def replace_object_args(expire, mapping, sets):
+    """
+    Builds the arguments of ``replace_object`` script.
+
+    Args:
+        expire (int): expire time of the keys
+        mapping (dict): fields of the object hash
+        sets (list): members of each set, in the order of their keys
+
+    Returns:
+        list
+    """
+    args = [expire, len(mapping) * 2]
+    for field, value in mapping.items():
+        args.extend((field, value))
+    return args + sets_args(sets)
+
+
+def replace_blob_args(expire, blob, sets):
+    """
+    Builds the arguments of ``replace_blob`` script.
+
+    Args:
+        expire (int): expire time of the keys
+        blob (bytes): encoded object
+        sets (list): members of each set, in the order of their keys
+
+    Returns:
+        list
+    """
+    return [expire, blob] + sets_args(sets)
+
+
+def sets_args(sets):
+    args = []
+    for members in sets:
+        args.append(len(members))
+        args.extend(members)
+    return args
+
+
+def parse_contact_statuses(response):
+    """
+    Parses the reply of ``contact_statuses`` script.
+
+    Returns:
+        list: (contact id, status dict) tuples
+    """
+    it = iter(response)
+    return [(contact, pairs_to_dict(status)) for contact, status in zip(it, it)]
@@ -0,0 +1,158 @@
+"""
+ASGI adapter of the falcon gateways, so that they can be served by an ASGI server, e.g.
+
+    uvicorn zopsm.roc.asgi:application --port 8888
+
+Requests are handled by the falcon application in a pool of ``ASGI_THREADS`` threads. Requests
+of the resources with ``rpc_replay`` do not hold a thread while they wait for the workers. A
+blocking ``RpcClient.rpc_call`` of such a resource raises ``RpcPending`` instead of waiting. The
+reply is awaited on the event loop, and the request is run again with an ``RpcReplay`` which
+returns the replies of its former runs, so thousands of requests can wait for the workers at once.
+
+A replayed request is run up to its last blocking rpc call once per call, so ``rpc_replay`` is
+only set by resources whose work before their rpc calls is free of other side effects, as it is
+for the resources of push and the roc resources which do not read caches. The other resources of
+roc read caches before their calls, which may take leases and wait for refills in redis, so their
+requests are run once and wait for the workers on their thread as they do under a WSGI server.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from zopsm.lib.rest.rpc import AsyncRpcClient, RpcPending, RpcReplay, rpc_context
+from zopsm.lib.settings import ASGI_THREADS
+
+
+class AsgiAdapter(object):
+    """
+    Args:
+        wsgi_app (falcon.API):
+        threads (int): requests run at once
+    """
+
+    def __init__(self, wsgi_app, threads=ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        body = await read_body(receive)
+        environ = wsgi_environ(scope, body)
+        replay = RpcReplay() if self.replayed(scope['path']) else None
+        loop = asyncio.get_event_loop()
+
+        while True:
+            try:
+                status, headers, chunks = await loop.run_in_executor(
+                    self.executor, self.run, environ, body, replay)
+                break
+            except RpcPending as pending:
+                replay.resume(await AsyncRpcClient(pending.rpc_client).wait(
+                    pending.corr_id, pending.future, pending.time_limit))
+
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    def replayed(self, path):
+        """
+        Returns:
+            bool: whether the resource of ``path`` has ``rpc_replay``
+        """
+        route = self.wsgi_app._router.find(path)
+        return route is not None and getattr(route[0], 'rpc_replay', False)
+
+    def run(self, environ, body, replay):
+        """
+        Runs the wsgi application in a thread of the pool, with blocking rpc calls if ``replay``
+        is None.
+
+        Returns:
+            tuple: status, headers and body chunks of the response
+
+        Raises:
+            RpcPending: if the request waits for the reply of a call
+        """
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+
+        environ = dict(environ, **{'wsgi.input': io.BytesIO(body)})
+        rpc_context.replay = replay
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                chunks = list(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            rpc_context.replay = None
+
+        return response[0], response[1], chunks
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def wsgi_environ(scope, body):
+    """
+    Args:
+        scope (dict): ASGI http scope
+        body (bytes): request body
+
+    Returns:
+        dict: WSGI environ of the request, without ``wsgi.input``
+    """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else 'HTTP_' + name
+        environ[key] = '{},{}'.format(environ[key], value) if key in environ else value
+
+    return environ
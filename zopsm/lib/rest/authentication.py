@@ -10,7 +10,8 @@ slave = os.getenv('REDIS_SLAVE')
 
 class ZopsKeyValueUserStorage(KeyValueUserStorage):
     def __init__(self):
-        super(ZopsKeyValueUserStorage, self).__init__(ZRedis(host=slave, db=os.getenv('REDIS_DB')))
+        super(ZopsKeyValueUserStorage, self).__init__(
+            ZRedis(host=slave, db=os.getenv('REDIS_DB'), decode_responses=True))
 
     def get_user(self, identified_with, identifier, req, resp, resource, uri_kwargs):
         """Get user object for given identifier.
@@ -27,22 +28,14 @@ class ZopsKeyValueUserStorage(KeyValueUserStorage):
 
         token_key = self.kv_store.hmget(CACHE_TOKENS_KEYS, identifier)[0]
 
-        stored_value = self.kv_store.hgetall(token_key)
-        user = {}
-        if stored_value:
-            for k, v in stored_value.items():
-                user[k.decode()] = v.decode()
-        else:
+        user = self.kv_store.hgetall(token_key)
+        if not user:
             from zopsm.roc.server import roc_admin_endpoints
             admin_endpoints = {}
             admin_endpoints.update(roc_admin_endpoints)
             if req.uri_template in admin_endpoints.keys():
                 if self.kv_store.sismember(ADMIN_TOKENS, identifier):
-                    admin_info = self.kv_store.hgetall(identifier)
-                    for k,v in admin_info.items():
-                        user[k.decode()] = v.decode()
-
-                    return user
+                    return self.kv_store.hgetall(identifier)
             user = None
 
         return user
@@ -30,6 +30,10 @@ class ZopsRPC:
 
 class ZopsBaseResource:
     allow_in_public_doc = True
+    # whether the requests of the resource may be run again on each reply of their rpc calls by
+    # zopsm.lib.rest.asgi. Only resources without side effects other than their rpc calls set it.
+    rpc_replay = False
+
     def require_representation(self, req):
         """Require raw representation dictionary from falcon request object.
 
@@ -0,0 +1,153 @@
+"""
+In-process stand-in of RabbitMQ and the workers, to test and benchmark ``RpcClient`` without a
+broker.
+
+``LocalBroker`` implements the parts of the ``pika.BlockingConnection`` api used by the rpc
+client. Calls are executed by a pool of worker threads with ``handler``, after a random latency,
+and replies are delivered to the callback queue named in ``reply_to``.
+"""
+import queue
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from zopsm.lib.codec import get_codec
+from zopsm.lib.rest.rpc import RpcClient
+
+Method = namedtuple('Method', 'queue')
+DeclareOk = namedtuple('DeclareOk', 'method')
+
+
+def echo(method, params):
+    return {"method": method, "params": params}
+
+
+class LocalChannel(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.is_closed = False
+
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def queue_declare(self, exclusive=False, **kwargs):
+        return DeclareOk(Method(self.connection.broker.declare_queue()))
+
+    def basic_consume(self, consumer_callback, queue, no_ack=False):
+        self.connection.consumers[queue] = consumer_callback
+        self.connection.broker.consumers[queue] = self.connection
+
+    def basic_publish(self, exchange, routing_key, properties, body):
+        if self.is_closed:
+            raise RuntimeError("Channel is closed")
+        self.connection.broker.publish(routing_key, properties, body)
+
+    def close(self):
+        self.is_closed = True
+
+
+class LocalConnection(object):
+    def __init__(self, broker):
+        self.broker = broker
+        self.consumers = {}  # queue: consumer callback
+        self.deliveries = queue.Queue()
+        self.is_closed = False
+
+    def channel(self):
+        return LocalChannel(self)
+
+    def deliver(self, queue_name, properties, body):
+        self.deliveries.put((queue_name, properties, body))
+
+    def process_data_events(self, time_limit=0):
+        """
+        Calls the consumers of the deliveries received in ``time_limit`` seconds, or of those
+        already received if it is 0.
+        """
+        try:
+            delivery = self.deliveries.get(timeout=time_limit) if time_limit else \
+                self.deliveries.get_nowait()
+            while True:
+                queue_name, properties, body = delivery
+                self.consumers[queue_name](self.channel(), None, properties, body)
+                delivery = self.deliveries.get_nowait()
+        except queue.Empty:
+            pass
+
+    def close(self):
+        self.is_closed = True
+
+
+class LocalBroker(object):
+    """
+    Args:
+        handler (callable): called with the method and params of a call, returns its result
+        latency (tuple): bounds of the random latency of the workers, in seconds
+        workers (int): calls executed in parallel
+    """
+
+    def __init__(self, handler=echo, latency=(0, 0), workers=32):
+        self.handler = handler
+        self.latency = latency
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.consumers = {}  # queue: connection
+        self.queue_ids = count()
+        self.published = 0
+
+    def connect(self):
+        return LocalConnection(self)
+
+    def declare_queue(self):
+        return "amq.gen-{}".format(next(self.queue_ids))
+
+    def publish(self, routing_key, properties, body):
+        self.published += 1
+        self.pool.submit(self.execute, properties, body)
+
+    def execute(self, properties, body):
+        codec = get_codec(properties.content_type)
+        request = codec.decode(body)
+        time.sleep(random.uniform(*self.latency))
+        if isinstance(request, list):
+            response = [self.respond(item) for item in request]
+        else:
+            response = self.respond(request)
+        connection = self.consumers.get(properties.reply_to)
+        if connection is not None:
+            connection.deliver(properties.reply_to, properties, codec.encode(response))
+
+    def respond(self, request):
+        response = {"jsonrpc": "2.0", "id": request['id']}
+        try:
+            response['result'] = self.handler(request['method'], request['params'])
+        except Exception as e:
+            response['error'] = {"code": getattr(e, 'code', -32603), "message": str(e)}
+        return response
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+class LocalRpcClient(RpcClient):
+    """
+    ``RpcClient`` connected to a ``LocalBroker``.
+    """
+
+    def __init__(self, broker, **kwargs):
+        self.broker = broker
+        super(LocalRpcClient, self).__init__(**kwargs)
+
+    def connect(self):
+        return self.broker.connect()
+
+
+class RpcError(Exception):
+    """
+    Raised by a handler of ``LocalBroker`` to reply with a json-rpc error.
+    """
+
+    def __init__(self, code, message):
+        super(RpcError, self).__init__(message)
+        self.code = code
@@ -2,6 +2,9 @@ from graceful.resources.generic import PaginatedListAPI
 from graceful.serializers import BaseSerializer
 from graceful.fields import RawField
 from graceful.resources.generic import Resource
+from falcon import HTTPForbidden
+from zopsm.lib.cache.metrics import metrics
+from zopsm.lib.rest.authentication import zops_authorization_required
 
 
 class URLSerializer(BaseSerializer):
@@ -37,3 +40,25 @@ class Ping(Resource):
     def retrieve(self, params, meta, **kwargs):
         return "pong"
 
+
+@zops_authorization_required
+class CacheMetrics(Resource, with_context=True):
+    """
+    Cache metrics of the project of the admin making the request, in the process serving it, see
+    ``CacheMetrics.snapshot``. Metrics of the other projects are not exposed.
+    """
+    allow_in_public_doc = False
+
+    def __repr__(self):
+        return "CacheMetrics"
+
+    def resource_name(self):
+        return "CacheMetrics"
+
+    def retrieve(self, params, meta, **kwargs):
+        user = kwargs.get('context').get('user')
+        if not user.get('admin_id'):
+            raise HTTPForbidden(title="Forbidden",
+                                description="Cache metrics are only available to admins.")
+        return metrics.snapshot(project=user.get('project_id'))
+
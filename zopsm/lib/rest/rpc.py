@@ -1,7 +1,8 @@
-import json
+import asyncio
 import uuid
 import pika
 import threading
+from concurrent.futures import Future, TimeoutError
 from time import sleep
 from pika.exceptions import ConnectionClosed
 import time
@@ -10,11 +11,18 @@ from falcon.errors import HTTPBadRequest, HTTPConflict, HTTPForbidden
 from falcon.errors import HTTPInternalServerError
 from falcon.errors import HTTPError
 from falcon.errors import status
+from zopsm.lib.codec import get_codec
+from zopsm.lib.settings import RPC_CODEC
 
 # wait for WORKER_TIMEOUT second to get result of rpc call
 # otherwise raise HTTPGatewayTimeout
 WORKER_TIMEOUT = 10
 
+# the consumer of the replies services the heartbeats of the publishing connection every
+# HEARTBEAT_CHECK_INTERVAL seconds, and reconnects after RECONNECT_INTERVAL seconds if it is lost
+HEARTBEAT_CHECK_INTERVAL = 1
+RECONNECT_INTERVAL = 1
+
 
 class HTTPGatewayTimeout(HTTPError):
     def __init__(self, title=None, description=None, **kwargs):
@@ -55,6 +63,18 @@ RPC_ERROR = {
 
 
 class RpcClient(object):
+    """
+    JSON-RPC client of the workers, shared by the threads of a gateway.
+
+    Calls of all threads are published over one connection, and their replies are consumed from
+    one callback queue. Outstanding calls are kept in ``pending``, a map of correlation id to
+    the future of the reply, so any number of calls can be in flight at once. Replies of unknown
+    correlation ids, e.g. of non-blocking or timed out calls, are dropped.
+
+    Replies are consumed on a connection of their own by a daemon thread, which blocks on its
+    socket and resolves the future of a reply as soon as it arrives. Callers block on their
+    future, so neither side polls.
+    """
     internal_lock = threading.Lock()
 
     def __init__(self,
@@ -62,6 +82,7 @@ class RpcClient(object):
                  connection_params=None,
                  rabbitmq_user="guest",
                  rabbitmq_pass="guest",
+                 codec=RPC_CODEC,
                  ):
 
         self.connection_params = connection_params if connection_params else  {
@@ -73,30 +94,61 @@ class RpcClient(object):
                                                  rabbitmq_pass)
 
         self.exchange = exchange
+        self.codec = get_codec(codec)
         self.exchange_declared = False
         self.connection = None
         self.channel = None
+        self.consumer_connection = None
+        self.callback_queue = None
+        self.pending = {}  # correlation id: future of the reply
 
         self.open_connection()
+        self.open_consumer_connection()
         thread = threading.Thread(target=self._process_data_events)
         thread.setDaemon(True)
         thread.start()
 
     def _process_data_events(self):
         """
+        Dispatches the replies to ``on_response`` as they arrive. In between, once every
+        ``HEARTBEAT_CHECK_INTERVAL`` seconds, the publishing connection processes its events,
+        so that its heartbeats are answered while it is idle without the replies contending with
+        the publishers for its lock.
+
         In order to come over the "ERROR:pika.adapters.base_connection:Socket Error on fd 34: 104"
         adapted from:
             https://github.com/pika/pika/issues/439
             https://github.com/pika/pika/issues/439#issuecomment-36452519
             https://github.com/eandersson/python-rabbitmq-examples/blob/master/Flask-examples/pika_async_rpc_example.py
         """
-        self.channel.basic_consume(self.on_response, no_ack=True,
-                                   queue=self.callback_queue)
-
+        last_serviced = time.monotonic()
         while True:
+            try:
+                self.consumer_connection.process_data_events(time_limit=HEARTBEAT_CHECK_INTERVAL)
+            except Exception:
+                # replies of the pending calls are routed to the callback queue of the lost
+                # connection
+                self.fail_pending("Connection is lost")
+                sleep(RECONNECT_INTERVAL)
+                try:
+                    self.open_consumer_connection()
+                except Exception:
+                    continue
+
+            if time.monotonic() - last_serviced < HEARTBEAT_CHECK_INTERVAL:
+                continue
+            last_serviced = time.monotonic()
             with self.internal_lock:
-                self.connection.process_data_events()
-            sleep(0.05)
+                try:
+                    if self.connection and not self.connection.is_closed:
+                        self.connection.process_data_events()
+                except ConnectionClosed:
+                    # it is reopened by the next call
+                    pass
+
+    def connect(self):
+        return pika.BlockingConnection(pika.ConnectionParameters(**self.connection_params,
+                                                                 credentials=self.credentials))
 
     def open_connection(self):
         """
@@ -104,8 +156,7 @@ class RpcClient(object):
         """
 
         if not self.connection or self.connection.is_closed:
-            self.connection = pika.BlockingConnection(pika.ConnectionParameters(**self.connection_params,
-                                                                                credentials=self.credentials))
+            self.connection = self.connect()
 
         if not self.channel or self.channel.is_closed:
             self.channel = self.connection.channel()
@@ -115,7 +166,14 @@ class RpcClient(object):
                                           auto_delete=False)
             self.exchange_declared = True
 
-        result = self.channel.queue_declare(exclusive=True)
+    def open_consumer_connection(self):
+        """
+        Connects the consumer of the replies and declares its callback queue.
+        """
+        self.consumer_connection = self.connect()
+        channel = self.consumer_connection.channel()
+        result = channel.queue_declare(exclusive=True)
+        channel.basic_consume(self.on_response, no_ack=True, queue=result.method.queue)
         self.callback_queue = result.method.queue
 
     def close_connection(self):
@@ -131,66 +189,377 @@ class RpcClient(object):
 
         self.connection, self.channel = None, None
 
+    def fail_pending(self, message):
+        for corr_id in list(self.pending):
+            future = self.pending.pop(corr_id, None)
+            if future is not None:
+                future.set_result({"error": {"code": -32603, "message": message}})
+
     def on_response(self, ch, method, props, body):
-        if self.corr_id == props.correlation_id:
-            self.response = json.loads(body)
+        future = self.pending.pop(props.correlation_id, None)
+        if future is not None:
+            try:
+                future.set_result(get_codec(props.content_type).decode(body))
+            except ValueError:
+                future.set_result({"error": {"code": -32700, "message": "Parse Error"}})
+
+    def submit(self, method, params, blocking=True):
+        """
+        Publishes a call of ``method`` to the workers.
 
-    def rpc_call(self, method, params, blocking=True, time_limit=WORKER_TIMEOUT):
-        self.response = None
-        self.corr_id = str(uuid.uuid4())
+        Args:
+            method (str): name of the worker job
+            params (dict): parameters of the job
+            blocking (bool): whether the reply is waited for
 
+        Returns:
+            tuple: correlation id of the call, future of the reply or None if it is non-blocking
+
+        Raises:
+            ConnectionClosed: if the connection is lost, the call is not pending
+        """
+        corr_id = str(uuid.uuid4())
         params['trackable'] = not blocking
 
-        self.message_properties = {
+        message_properties = {
             "jsonrpc": "2.0",
             "method": method,
             "params": params,
-            "id": self.corr_id
+            "id": corr_id
         }
 
+        return self.submit_message(method, message_properties, corr_id, blocking=blocking)
+
+    def submit_batch(self, calls):
+        """
+        Publishes blocking calls to the workers as a json-rpc batch, in a single message. The
+        batch is routed by the method of its first call, and its calls are executed one by one.
+
+        Args:
+            calls (list): (method, params) tuples
+
+        Returns:
+            tuple: correlation id of the batch, future of the reply
+
+        Raises:
+            ConnectionClosed: if the connection is lost, the call is not pending
+        """
+        corr_id = str(uuid.uuid4())
+        batch = []
+        for index, (method, params) in enumerate(calls):
+            params['trackable'] = False
+            batch.append({"jsonrpc": "2.0", "method": method, "params": params, "id": index})
+
+        return self.submit_message(calls[0][0], batch, corr_id)
+
+    def submit_message(self, routing_key, message, corr_id, blocking=True):
+        """
+        Returns:
+            tuple: correlation id of the message, future of the reply or None if it is
+                non-blocking
+        """
+        # registered before publishing, the reply may be consumed before basic_publish returns
+        future = Future() if blocking else None
+        if blocking:
+            self.pending[corr_id] = future
+
         try:
-            if not self.connection or self.connection.is_closed or not self.channel or self.channel.is_closed:
-                with self.internal_lock:
+            with self.internal_lock:
+                if not self.connection or self.connection.is_closed or not self.channel or \
+                        self.channel.is_closed:
                     self.open_connection()
 
-            with self.internal_lock:
                 self.channel.basic_publish(
                     exchange=self.exchange,
-                    routing_key='post_message',
+                    routing_key=routing_key,
                     properties=pika.BasicProperties(
                         reply_to=self.callback_queue,
-                        correlation_id=self.corr_id,),
-                    body=json.dumps(self.message_properties, ensure_ascii=False))
+                        correlation_id=corr_id,
+                        content_type=self.codec.content_type,),
+                    body=self.codec.encode(message))
+        except Exception:
+            self.pending.pop(corr_id, None)
+            raise
+
+        return corr_id, future
+
+    def publish(self, method, params, blocking=True):
+        """
+        Publishes a call with ``submit``, and again after reconnecting if the connection is lost.
+
+        Returns:
+            tuple: correlation id of the call, future of the reply or None if it is non-blocking,
+                error response if the call could not be published or None
+        """
+        return self.retry_publish(self.submit, method, params, blocking)
+
+    def publish_batch(self, calls):
+        """
+        Publishes a batch of calls with ``submit_batch``, like ``publish``.
+        """
+        return self.retry_publish(self.submit_batch, calls)
+
+    def retry_publish(self, submit, *args):
+        try:
+            corr_id, future = submit(*args)
 
         except ConnectionClosed:
             with self.internal_lock:
                 self.close_connection()
                 self.open_connection()
-            return self.rpc_call(method, params, blocking=blocking, time_limit=time_limit)
+            return self.retry_publish(submit, *args)
 
         except Exception as e:
-            self.response = {"error": {"code": -32603, "message": "Can not connect AMQP or another error occured!"}, }
             self.close_connection()
+            return None, None, {"error": {"code": -32603, "message": "Can not connect AMQP or another error occured!"}, }
+
+        return corr_id, future, None
+
+    def wait(self, corr_id, future, time_limit=WORKER_TIMEOUT):
+        """
+        Returns:
+            dict: reply of the call, or a worker timeout error if it does not arrive in
+                ``time_limit`` seconds
+        """
+        try:
+            return future.result(timeout=time_limit)
+        except TimeoutError:
+            self.pending.pop(corr_id, None)
+            return {"error": {"code": -32003, "message": "Worker timeout"}, }
+
+    def rpc_call(self, method, params, blocking=True, time_limit=WORKER_TIMEOUT):
+        replay = getattr(rpc_context, 'replay', None)
+        if replay is not None:
+            return replay.call(self, method, params, blocking, time_limit)
+
+        corr_id, future, response = self.publish(method, params, blocking=blocking)
+
+        if not blocking and response is None:
+            return queued(params, corr_id)
+
+        if response is None:
+            response = self.wait(corr_id, future, time_limit)
+
+        return rpc_result(response)
 
-        if not blocking and self.response is None:
-            # todo check every response of non-blocking rpc to return the tracking id
-            # indicates that the erroneous response of event can be tracked with this id via ws
-            params['tracking_id'] = self.corr_id
-            return params  # "Job is queued"
+    def rpc_call_batch(self, calls, time_limit=WORKER_TIMEOUT):
+        """
+        Calls the workers with a json-rpc batch, so that the calls cost a single round trip.
+
+        Args:
+            calls (list): (method, params) tuples of blocking calls
+            time_limit (int): seconds to wait for the replies of all calls
+
+        Returns:
+            list: results of the calls in order, the error of a failed call in place of its result
+
+        Raises:
+            HTTPError: if the batch fails as a whole, e.g. on a worker timeout
+        """
+        if not calls:
+            return []
+
+        replay = getattr(rpc_context, 'replay', None)
+        if replay is not None:
+            return replay.call_batch(self, calls, time_limit)
+
+        corr_id, future, response = self.publish_batch(calls)
+
+        if response is None:
+            response = self.wait(corr_id, future, time_limit)
+
+        return batch_results(response, len(calls))
+
+
+class AsyncRpcClient(object):
+    """
+    asyncio client of the workers. Calls are published over the connection of ``rpc_client`` and
+    their replies are awaited on the event loop, so a call holds no thread while it waits for the
+    workers. Timeouts and errors are the same as of ``RpcClient.rpc_call``.
+    """
+
+    def __init__(self, rpc_client):
+        self.rpc_client = rpc_client
 
-        deadline = time.time() + time_limit
+    async def rpc_call(self, method, params, blocking=True, time_limit=WORKER_TIMEOUT):
+        # publishing may wait for the connection lock or a reconnect, so it runs in the executor
+        corr_id, future, response = await asyncio.get_event_loop().run_in_executor(
+            None, self.rpc_client.publish, method, params, blocking)
 
-        while self.response is None:
-            time_limit = deadline - time.time()
-            if time_limit <= 0:
-                self.response = {"error": {"code": -32003, "message": "Worker timeout"}, }
+        if not blocking and response is None:
+            return queued(params, corr_id)
 
-        if "result" in self.response:
-            return self.response['result']
+        if response is None:
+            response = await self.wait(corr_id, future, time_limit)
+
+        return rpc_result(response)
+
+    async def rpc_call_batch(self, calls, time_limit=WORKER_TIMEOUT):
+        """
+        Coroutine of ``RpcClient.rpc_call_batch``.
+        """
+        if not calls:
+            return []
+
+        corr_id, future, response = await asyncio.get_event_loop().run_in_executor(
+            None, self.rpc_client.publish_batch, calls)
+
+        if response is None:
+            response = await self.wait(corr_id, future, time_limit)
+
+        return batch_results(response, len(calls))
+
+    async def wait(self, corr_id, future, time_limit=WORKER_TIMEOUT):
+        """
+        Returns:
+            dict: reply of the call, or a worker timeout error if it does not arrive in
+                ``time_limit`` seconds
+        """
+        try:
+            # shielded, a timeout must not cancel the future which is resolved by on_response
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), time_limit)
+        except asyncio.TimeoutError:
+            self.rpc_client.pending.pop(corr_id, None)
+            return {"error": {"code": -32003, "message": "Worker timeout"}, }
 
-        if "error" in self.response:
-            error, msg = RPC_ERROR.get(self.response['error']['code'],
-                                       UnKnownException), self.response['error']['message']
-            raise error(description=msg)
 
+# rpc calls of the requests run by zopsm.lib.rest.asgi are made through the RpcReplay of the
+# request in this thread
+rpc_context = threading.local()
 
+
+class RpcPending(BaseException):
+    """
+    Raised by ``RpcClient.rpc_call`` instead of waiting for a reply, when the request is run with
+    an ``RpcReplay``. It is not an Exception, so that it passes through the error handling of the
+    resources and of falcon.
+    """
+
+    def __init__(self, rpc_client, corr_id, future, time_limit):
+        super(RpcPending, self).__init__(corr_id)
+        self.rpc_client = rpc_client
+        self.corr_id = corr_id
+        self.future = future
+        self.time_limit = time_limit
+
+
+class RpcReplay(object):
+    """
+    Rpc calls of a request which is run again each time a reply it waits for arrives. Calls made
+    by the former runs are not published again, their outcomes are returned in the same order.
+    """
+
+    def __init__(self):
+        self.outcomes = []  # (blocking, reply or queued params) of the calls, in order
+        self.index = 0
+
+    def replayed(self):
+        """
+        Returns:
+            tuple: (blocking, reply or queued params) of the next call if it was made by a former
+                run, otherwise None
+        """
+        index, self.index = self.index, self.index + 1
+        return self.outcomes[index] if index < len(self.outcomes) else None
+
+    def call(self, rpc_client, method, params, blocking, time_limit):
+        outcome = self.replayed()
+        if outcome is not None:
+            blocking, outcome = outcome
+            return rpc_result(outcome) if blocking else dict(outcome)
+
+        corr_id, future, response = rpc_client.publish(method, params, blocking=blocking)
+
+        if response is not None:
+            return rpc_result(response)
+
+        if not blocking:
+            params = queued(params, corr_id)
+            self.outcomes.append((False, dict(params)))
+            return params
+
+        raise RpcPending(rpc_client, corr_id, future, time_limit)
+
+    def call_batch(self, rpc_client, calls, time_limit):
+        outcome = self.replayed()
+        if outcome is not None:
+            return batch_results(outcome[1], len(calls))
+
+        corr_id, future, response = rpc_client.publish_batch(calls)
+
+        if response is not None:
+            return rpc_result(response)
+
+        raise RpcPending(rpc_client, corr_id, future, time_limit)
+
+    def resume(self, reply):
+        """
+        Records the reply of the pending call, before the request is run again.
+        """
+        self.outcomes.append((True, reply))
+        self.index = 0
+
+
+def queued(params, corr_id):
+    """
+    Returns:
+        dict: params of a non-blocking call, with its tracking id
+    """
+    # todo check every response of non-blocking rpc to return the tracking id
+    # indicates that the erroneous response of event can be tracked with this id via ws
+    params['tracking_id'] = corr_id
+    return params  # "Job is queued"
+
+
+def rpc_result(response):
+    """
+    Returns:
+        result of a json-rpc response
+
+    Raises:
+        HTTPError: mapped by ``RPC_ERROR`` from the error of the response
+    """
+    if "result" in response:
+        return response['result']
+
+    if "error" in response:
+        error, msg = RPC_ERROR.get(response['error']['code'],
+                                   UnKnownException), response['error']['message']
+        raise error(description=msg)
+
+
+def batch_results(response, count):
+    """
+    Args:
+        response (list|dict): responses of the calls of a batch, or an error of the whole batch
+        count (int): number of the calls
+
+    Returns:
+        list: results of the calls in order, the error of a failed call in place of its result
+
+    Raises:
+        HTTPError: mapped by ``RPC_ERROR`` from the error of the whole batch, or of a response
+            which does not match a call
+    """
+    if isinstance(response, dict):
+        return rpc_result(response)
+
+    responses = {}
+    for item in response:
+        index = item.get('id') if isinstance(item, dict) else None
+        if type(index) is not int or index not in range(count):
+            # e.g. the error of a request which could not be parsed fails the whole batch
+            error = item.get('error') if isinstance(item, dict) else None
+            return rpc_result({"error": error or {"code": -32603, "message": "Invalid Response"}})
+        responses[index] = item
+
+    results = []
+    for index in range(count):
+        if index not in responses:
+            results.append(HTTPInternalServerError(description="Call has no response"))
+            continue
+        try:
+            results.append(rpc_result(responses[index]))
+        except Exception as e:
+            results.append(e)
+    return results
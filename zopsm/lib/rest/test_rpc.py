@@ -0,0 +1,203 @@
+import asyncio
+import falcon
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from falcon.errors import HTTPInternalServerError, HTTPNotFound
+from zopsm.lib.rest.asgi import AsgiAdapter
+from zopsm.lib.rest.local_broker import LocalBroker, LocalRpcClient, RpcError
+from zopsm.lib.rest.rpc import AsyncRpcClient, HTTPGatewayTimeout, batch_results
+
+THREADS = 32
+CALLS = 20
+
+
+@pytest.fixture
+def broker():
+    broker = LocalBroker(latency=(0, 0.01))
+    yield broker
+    broker.shutdown()
+
+
+def test_concurrent_calls_get_their_own_replies(broker):
+    client = LocalRpcClient(broker)
+
+    def calls(thread):
+        return [client.rpc_call("get_obj_data", {"thread": thread, "call": call})['params']
+                for call in range(CALLS)]
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(calls, range(THREADS)))
+
+    for thread, params in enumerate(results):
+        assert [(p['thread'], p['call']) for p in params] == [(thread, c) for c in range(CALLS)]
+    assert broker.published == THREADS * CALLS
+    assert client.pending == {}
+
+
+def test_msgpack_calls(broker):
+    pytest.importorskip("msgpack")
+    client = LocalRpcClient(broker, codec="application/msgpack")
+    result = client.rpc_call("list_messages", {"results": [{"body": "merhaba"}] * 3})
+
+    assert result['params']['results'] == [{"body": "merhaba"}] * 3
+
+
+def test_non_blocking_call_is_not_pending(broker):
+    client = LocalRpcClient(broker)
+    params = client.rpc_call("post_message", {"text": "hi"}, blocking=False)
+
+    assert params['trackable'] and params['tracking_id']
+    assert client.pending == {}
+
+
+def test_error_reply_raises_mapped_error():
+    def handler(method, params):
+        raise RpcError(-32002, "Object Not Found")
+
+    broker = LocalBroker(handler)
+    with pytest.raises(HTTPNotFound):
+        LocalRpcClient(broker).rpc_call("get_obj_data", {})
+    broker.shutdown()
+
+
+def test_timed_out_call_is_dropped():
+    broker = LocalBroker(latency=(0.5, 0.5))
+    client = LocalRpcClient(broker)
+    with pytest.raises(HTTPGatewayTimeout):
+        client.rpc_call("get_obj_data", {}, time_limit=0.1)
+    assert client.pending == {}
+    broker.shutdown()
+
+
+def test_batch_call_costs_one_message():
+    def handler(method, params):
+        if params['id'] == "missing":
+            raise RpcError(-32002, "Object Not Found")
+        return params['id']
+
+    broker = LocalBroker(handler)
+    client = LocalRpcClient(broker)
+    results = client.rpc_call_batch([("get_obj_data", {"id": "a"}),
+                                     ("get_obj_data", {"id": "missing"}),
+                                     ("get_channel", {"id": "b"})])
+
+    assert results[0] == "a" and results[2] == "b"
+    assert isinstance(results[1], HTTPNotFound)
+    assert broker.published == 1
+    assert client.rpc_call_batch([]) == []
+    broker.shutdown()
+
+
+def test_batch_responses_are_matched_to_calls_by_id():
+    results = batch_results([{"jsonrpc": "2.0", "id": 1, "result": "b"}], 3)
+
+    assert results[1] == "b"
+    assert isinstance(results[0], HTTPInternalServerError) and results[0] is not results[2]
+    with pytest.raises(HTTPNotFound):
+        batch_results([{"jsonrpc": "2.0", "id": None,
+                        "error": {"code": -32002, "message": "Object Not Found"}}], 2)
+    with pytest.raises(HTTPInternalServerError):
+        batch_results([{"jsonrpc": "2.0", "id": 2, "result": "c"}], 2)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_async_calls_get_their_own_replies(broker):
+    client = AsyncRpcClient(LocalRpcClient(broker))
+
+    async def calls():
+        return await asyncio.gather(*[client.rpc_call("get_obj_data", {"call": call})
+                                      for call in range(THREADS * CALLS)])
+
+    results = run(calls())
+
+    assert [result['params']['call'] for result in results] == list(range(THREADS * CALLS))
+    assert client.rpc_client.pending == {}
+
+
+def test_async_call_raises_mapped_errors():
+    def handler(method, params):
+        raise RpcError(-32002, "Object Not Found")
+
+    broker = LocalBroker(handler, latency=(0.5, 0.5))
+    client = AsyncRpcClient(LocalRpcClient(broker))
+    with pytest.raises(HTTPGatewayTimeout):
+        run(client.rpc_call("get_obj_data", {}, time_limit=0.1))
+    with pytest.raises(HTTPNotFound):
+        run(client.rpc_call("get_obj_data", {}))
+    assert client.rpc_client.pending == {}
+    broker.shutdown()
+
+
+class Channel(object):
+    rpc_replay = True
+
+    def __init__(self, rpc_client):
+        self.rpc_client = rpc_client
+
+    def on_get(self, req, resp, channel_id):
+        queued = self.rpc_client.rpc_call("update_channel", {"id": channel_id}, blocking=False)
+        first = self.rpc_client.rpc_call("get_channel", {"id": channel_id})
+        second, third = self.rpc_client.rpc_call_batch([("get_channel", {"id": channel_id + "2"}),
+                                                        ("get_channel", {"id": channel_id + "3"})])
+        resp.body = json.dumps({"queued": queued['tracking_id'],
+                                "ids": [first['params']['id'], second['params']['id'],
+                                        third['params']['id']]})
+
+
+def asgi_get(application, path):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+             'headers': [(b'host', b'localhost')]}
+    run(application(scope, receive, send))
+    return messages[0]['status'], json.loads(messages[1]['body'].decode())
+
+
+def test_asgi_requests_do_not_repeat_rpc_calls(broker):
+    app = falcon.API()
+    app.add_route("/channels/{channel_id}", Channel(LocalRpcClient(broker)))
+
+    status, body = asgi_get(AsgiAdapter(app, threads=1), "/channels/a")
+
+    assert status == 200
+    assert body['ids'] == ["a", "a2", "a3"] and body['queued']
+    assert broker.published == 3
+
+
+class CachedChannel(Channel):
+    rpc_replay = False
+
+    def __init__(self, rpc_client):
+        super(CachedChannel, self).__init__(rpc_client)
+        self.cache_writes = 0
+
+    def on_get(self, req, resp, channel_id):
+        # stands for a cache call with side effects, e.g. a refill taking a lease
+        self.cache_writes += 1
+        super(CachedChannel, self).on_get(req, resp, channel_id)
+
+
+def test_asgi_runs_resources_without_rpc_replay_once(broker):
+    app = falcon.API()
+    resource = CachedChannel(LocalRpcClient(broker))
+    app.add_route("/channels/{channel_id}", resource)
+
+    status, body = asgi_get(AsgiAdapter(app, threads=1), "/channels/a")
+
+    assert status == 200
+    assert body['ids'] == ["a", "a2", "a3"]
+    assert resource.cache_writes == 1 and broker.published == 3
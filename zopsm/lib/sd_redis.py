@@ -1,7 +1,9 @@
 import random
 import os
+import threading
 from zopsm.lib.sd_consul import consul_client
 from zopsm.lib.credis import ZRedis
+from zopsm.lib.redis_pool import PooledRedis, RoutingRedis
 from zopsm.lib.log_handler import zlogger
 from zopsm.lib.sd_vault import vault
 from zopsm.lib.settings import WORKING_ENVIRONMENT
@@ -10,6 +12,115 @@ redis_master = None
 redis_slave = None
 redis_db_pw = vault.read('db/redis_{}'.format(WORKING_ENVIRONMENT))['data']['pw']
 
+# pooled clients of the redis master and of a replica per db, and non-blocking clients of the
+# master, they follow the nodes reported by watch_redis
+master_clients = {}
+replica_clients = {}
+async_master_clients = {}
+clients_lock = threading.Lock()
+
+
+def master_client(host=None, db=None, decode_responses=False):
+    """
+    Returns the process wide pooled client of the redis master for ``db``.
+
+    Args:
+        host (str): master address to use if the client is not created yet, defaults to the
+        master found by ``watch_redis``
+        db (str): redis db number
+        decode_responses (bool): whether replies are decoded to str
+
+    Returns:
+        PooledRedis
+    """
+    with clients_lock:
+        client = master_clients.get((db, decode_responses))
+        if client is None:
+            client = master_clients[(db, decode_responses)] = PooledRedis(
+                host=host or redis_master,
+                password=redis_db_pw,
+                db=db,
+                decode_responses=decode_responses)
+        return client
+
+
+def replica_client(host=None, db=None, decode_responses=False):
+    """
+    Returns the process wide pooled client of a redis replica for ``db``. It does not wait for a
+    failover on connection errors, so that callers can fall back to the master right away.
+
+    Args:
+        host (str): replica address to use if the client is not created yet, defaults to the
+        slave found by ``watch_redis``
+        db (str): redis db number
+        decode_responses (bool): whether replies are decoded to str
+
+    Returns:
+        PooledRedis
+    """
+    with clients_lock:
+        client = replica_clients.get((db, decode_responses))
+        if client is None:
+            client = replica_clients[(db, decode_responses)] = PooledRedis(
+                host=host or redis_slave,
+                password=redis_db_pw,
+                db=db,
+                decode_responses=decode_responses,
+                failover_wait=0,
+                role='replica')
+        return client
+
+
+def async_master_client(host=None, db=None, decode_responses=False):
+    """
+    Returns the non-blocking client of the redis master for ``db``, to be used on the tornado
+    IOLoop of the process.
+
+    Args:
+        host (str): master address to use if the client is not created yet, defaults to the
+        master found by ``watch_redis``
+        db (str): redis db number
+        decode_responses (bool): whether replies are decoded to str
+
+    Returns:
+        AsyncRedis
+    """
+    # tornado is only installed to the services running an IOLoop
+    from zopsm.lib.async_redis import AsyncRedis
+
+    with clients_lock:
+        client = async_master_clients.get((db, decode_responses))
+        if client is None:
+            client = async_master_clients[(db, decode_responses)] = AsyncRedis(
+                host=host or redis_master,
+                password=redis_db_pw,
+                db=db,
+                decode_responses=decode_responses)
+        return client
+
+
+def router_client(master=None, slave=None, db=None, decode_responses=False):
+    """
+    Returns a client which sends read-only commands to the replica and the rest to the master.
+    Everything goes to the master when no replica address is known.
+
+    Returns:
+        RoutingRedis
+    """
+    slave = slave or redis_slave
+    return RoutingRedis(
+        master_client(host=master, db=db, decode_responses=decode_responses),
+        replica_client(host=slave, db=db, decode_responses=decode_responses) if slave else None)
+
+
+def switch_clients(clients, host):
+    with clients_lock:
+        clients = list(clients.values())
+    for client in clients:
+        if client.host != host:
+            zlogger.info(f"Switching redis clients of db {client.db} to {host}.")
+            client.switch_host(host)
+
 
 def watch_redis(single=False):
     global redis_master, redis_slave
@@ -21,6 +132,9 @@ def watch_redis(single=False):
             redis_nodes = [node['ServiceAddress'] for node in data]
             zlogger.info(f"Redis Nodes are changed. New nodes are {redis_nodes}.")
             redis_master, redis_slave = find_redis_role(redis_nodes)
+            switch_clients(master_clients, redis_master)
+            switch_clients(replica_clients, redis_slave)
+            switch_clients(async_master_clients, redis_master)
             if single:
                 zlogger.info(f"Redis Master: {redis_master}")
                 zlogger.info(f"Redis Slave: {redis_slave}")
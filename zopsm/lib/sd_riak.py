@@ -4,6 +4,7 @@ from zopsm.lib.sd_consul import consul_client
 from riak.riak_object import RiakObject
 from zopsm.lib.cache.channel_cache import ChannelCache
 from zopsm.lib.cache.subscriber_cache import SubscriberCache
+from zopsm.lib.cache.write_behind import cache_writer
 from riak.resolver import last_written_resolver
 from zopsm.lib.log_handler import zlogger
 from zopsm.lib.settings import WORKING_ENVIRONMENT
@@ -34,7 +35,8 @@ class ZRiakObject(RiakObject):
         Stores objects by calling super().store() to riak.
 
         If the bucket is in the `BUCKET_CACHE_MAP` and `without_cache` is not explicitly passed as
-        True, it also stores to the cache, does nothing otherwise.
+        True, it also queues the object to be stored to the cache, does nothing otherwise. The
+        cache is written in the background by `cache_writer`.
 
         Args:
 
@@ -44,26 +46,24 @@ class ZRiakObject(RiakObject):
             **kwargs (dict): riak object's store method's kwargs
         """
         super().store(**kwargs)
-        # todo There should be a background job to store data to redis in the future
 
         # usermeta must alrady be updated with these properties at creation of the object
         if self.usermeta.get('bucket_name', None) in BUCKET_CACHE_MAP and not without_cache:
-            cache_obj = self.get_cache_obj()
-            cache_obj.set(self.data)
+            cache_writer.set(self.get_cache_obj(), self.data)
 
         return self
 
     def delete(self, **kwargs):
         """
         Deletes objects by calling super().delete() from riak.
-        If the bucket is in the `BUCKET_CACHE_MAP`, it also deletes from the cache.
+        If the bucket is in the `BUCKET_CACHE_MAP`, it also queues the object to be deleted from
+        the cache.
         Args:
             **kwargs:
         Returns:
         """
         if self.usermeta.get('bucket_name', None) in BUCKET_CACHE_MAP:
-            cache_obj = self.get_cache_obj()
-            cache_obj.delete()
+            cache_writer.delete(self.get_cache_obj())
         return super().delete(**kwargs)
 
 
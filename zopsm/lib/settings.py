@@ -12,6 +12,71 @@ WORKING_ENVIRONMENT = os.getenv('WORKING_ENVIRONMENT', 'zopsm')
 VIRTUAL_HOST = os.getenv('RABBIT_VHOST', 'zopsm')
 
 
+# Queue groups of the rpc jobs of the workers. Calls are published with their method name as the
+# routing key and are consumed from the queue of the group of the method, so that slow jobs do not
+# delay the others. Methods that are not listed belong to RPC_DEFAULT_QUEUE_GROUP.
+RPC_DEFAULT_QUEUE_GROUP = "interactive"
+RPC_QUEUE_GROUPS = {
+    "interactive": (),
+    "bulk": (
+        "create_channel_as_admin",
+        "update_channel_as_admin",
+        "add_subscribers_to_channel_as_admin",
+        "status_notify_contacts",
+        "delete_push_tag",
+        "delete_all_push_target_tags",
+        "delete_all_push_client_tags",
+    ),
+    "push-fanout": (
+        "post_push_message",
+    ),
+}
+RPC_QUEUE = "rpc_queue_{group}"
+# groups consumed by a worker process, by a server of their own each, e.g. "bulk" for the workers
+# of a pool dedicated to bulk jobs
+RPC_WORKER_QUEUE_GROUPS = os.getenv('RPC_WORKER_QUEUE_GROUPS', ','.join(RPC_QUEUE_GROUPS)).split(',')
+# jobs executed at once by the server of a queue group, and requests delivered to it before they
+# are acknowledged, 0 prefetches as many requests as the jobs executed at once
+RPC_WORKER_CONCURRENCY = int(os.getenv('RPC_WORKER_CONCURRENCY', 8))
+RPC_WORKER_PREFETCH = int(os.getenv('RPC_WORKER_PREFETCH', 0))
+# content type of the rpc calls of the gateways and of their replies, "application/json" or
+# "application/msgpack" if msgpack is installed, see zopsm.lib.codec
+RPC_CODEC = os.getenv('RPC_CODEC', 'application/json')
+# threads of an ASGI gateway which run the requests between their rpc calls, see zopsm.lib.rest.asgi
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))
+
+
+# Redis connection pool
+REDIS_POOL_MAX_CONNECTIONS = int(os.getenv('REDIS_POOL_MAX_CONNECTIONS', 50))
+REDIS_POOL_TIMEOUT = 5  # seconds to wait for a free connection when the pool is full
+REDIS_POOL_HEALTH_CHECK_INTERVAL = 30  # idle seconds after which a connection is pinged on reuse
+REDIS_FAILOVER_WAIT = 2  # seconds to wait for a new master before a connection error is raised
+REDIS_SCAN_COUNT = 1000  # COUNT hint of the SCAN family iterators
+
+# Process local cache of subscriber and channel objects
+CACHE_LOCAL_MAX_SIZE = int(os.getenv('CACHE_LOCAL_MAX_SIZE', 10000))  # 0 disables it
+CACHE_LOCAL_TTL = 60  # seconds, bounds stale reads when an invalidation message is missed
+CACHE_INVALIDATION_CHANNEL = "CacheInvalidation"  # pub/sub channel of rewritten cache objects
+
+# Write-behind of the cache objects stored to riak
+CACHE_WRITE_QUEUE_SIZE = int(os.getenv('CACHE_WRITE_QUEUE_SIZE', 10000))  # pending objects
+CACHE_WRITE_FLUSH_TIMEOUT = 10  # seconds to wait for the pending writes when a process exits
+
+# Storage of the subscriber and channel cache objects, "keys" stores an object as a hash and a set
+# per field, "blob" stores it as a single encoded value along with the sets used in set operations
+CACHE_STORAGE_KEYS = "keys"
+CACHE_STORAGE_BLOB = "blob"
+CACHE_STORAGE = os.getenv('CACHE_STORAGE', CACHE_STORAGE_KEYS)
+
+# Refill of the missed cache objects, one caller per object refills it while holding a lease
+CACHE_LEASE = "Lease:{key}"
+CACHE_LEASE_TIME = 10  # seconds, the worker timeout of the rpc which refills the object
+CACHE_LEASE_POLL = 0.05  # seconds between the reads of the waiting callers
+CACHE_EXPIRE_JITTER = 0.1  # expire times are shortened by up to this ratio at random
+
+# seconds between the dumps of the cache metrics of a process to the log, 0 disables them
+CACHE_METRICS_DUMP_INTERVAL = int(os.getenv('CACHE_METRICS_DUMP_INTERVAL', 0))
+
 # Redis keys and prefixes
 
 """
@@ -38,13 +103,13 @@ prefixes:
     
     Man: Managers
     
-    OnSub: OnlineSubscribers
     Own: Owners
     
     P: Projects
     PGSK: Push Google Server API Key
     PGPN: Push Google Project Number (Sender ID)
     PAPC: Push APNS iOS Push Certificate (ascii text)
+    Presence: Online and idle subscribers by their last activity
     
     RefTok: RefreshTokens
     
@@ -58,15 +123,16 @@ prefixes:
  
 """
 
-# Online Subscribers
-CACHE_ONLINE_SUBSCRIBERS = "P:{project_id}:S:{service}:OnSub"
-
-# Idle Subscribers
-CACHE_IDLE_SUBSCRIBERS = "P:{project_id}:S:{service}:IdleSub"
+# Presence index, sorted set of online and idle subscribers scored by the unix time of their last
+# activity. Subscribers without activity in the last CACHE_STATUS_EXPIRE seconds are offline and
+# swept from it.
+CACHE_PRESENCE = "P:{project_id}:S:{service}:Presence"
 
 # Subscriber
 CACHE_SUBSCRIBER_EXPIRE = 60 * 60 * 24 * 3  # 3 days
 CACHE_SUBSCRIBERS = "P:{project_id}:S:{service}:Sub:{subscriber_id}"
+# Encoded subscriber, in blob storage
+CACHE_SUBSCRIBER_BLOB = "P:{project_id}:S:{service}:Sub:{subscriber_id}:Blob"
 
 # Status of a subscriber
 CACHE_STATUS = "P:{project_id}:S:{service}:St:{subscriber_id}"
@@ -104,6 +170,8 @@ CACHE_SUBSCRIBER_CONTACT_REQUESTS_OUT = "P:{project_id}:S:{service}:Sub:{subscri
 # Channel
 CACHE_CHANNEL_EXPIRE = 60 * 60 * 24 * 3  # 3 days
 CACHE_CHANNELS = "P:{project_id}:S:{service}:Ch:{channel_id}"
+# Encoded channel, in blob storage
+CACHE_CHANNEL_BLOB = "P:{project_id}:S:{service}:Ch:{channel_id}:Blob"
 # Channel Managers
 CACHE_CHANNEL_MANAGERS = "P:{project_id}:S:{service}:Ch:{channel_id}:Man"
 # Channel Subscribers
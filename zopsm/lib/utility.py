@@ -1,3 +1,4 @@
+from itertools import islice
 from uuid import uuid4
 
 
@@ -5,3 +6,18 @@ def generate_uuid():
     return uuid4().hex
 
 
+def chunks(iterable, size):
+    """
+    Splits ``iterable`` into lists of at most ``size`` items without consuming it as a whole.
+
+    Yields:
+        list
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
@@ -12,8 +12,6 @@ from zopsm.lib.log_handler import zlogger
 from zopsm.lib import sd_rabbit, sd_redis
 from zopsm.lib.settings import VIRTUAL_HOST
 from zopsm.lib.settings import CACHE_TOKENS_KEYS, CACHE_SUBSCRIBER_CHANNELS
-from zopsm.lib.credis import ZRedis
-from zopsm.lib.sd_redis import redis_db_pw
 
 
 class QueueManager(object):
@@ -34,9 +32,7 @@ class QueueManager(object):
         while not getattr(sd_redis, 'redis_master'):
             time.sleep(0.01)
 
-        self.cache = ZRedis(host=sd_redis.redis_master,
-                            password=redis_db_pw,
-                            db=os.getenv('REDIS_DB'))
+        self.cache = sd_redis.async_master_client(db=os.getenv('REDIS_DB'), decode_responses=True)
         self.connect()
 
     def connect(self, host=None):
@@ -115,7 +111,7 @@ class QueueManager(object):
         for listener in notify_list:
             listener.write_message(message)
 
-    def add_event_listener(self, listener, user_info):
+    async def add_event_listener(self, listener, user_info):
         """
         Add listener to user set. If queue creation is new, 
         
@@ -125,9 +121,13 @@ class QueueManager(object):
             queue_name = self.get_queue_name(user_id)
             self.channel.queue_declare(queue=queue_name, auto_delete=True, callback=None)
             self.event_listeners.setdefault(user_id, []).append(listener)
-            self.input_queue_bind(queue_name, user_info)
+            await self.input_queue_bind(queue_name, user_info)
+            if not self.event_listeners.get(user_id):
+                # every listener of the user is closed while reading the bind list, the queue
+                # is already deleted
+                return
             self.listen_messages(queue_name, user_id)
-            self.cache.sadd('QueueList:{}'.format(user_id), queue_name)
+            await self.cache.sadd('QueueList:{}'.format(user_id), queue_name)
 
         else:
             self.event_listeners[user_id].append(listener)
@@ -150,7 +150,7 @@ class QueueManager(object):
             zlogger.error("An error occurred on remove_event_listener method inside QueueManager. "
                           "User Id: {}, Exception: {}".format(user_id, exc))
 
-    def input_queue_bind(self, queue, user_info):
+    async def input_queue_bind(self, queue, user_info):
         """
         Input queue   declaration callback.
         Input Queue/Exchange binding done here
@@ -160,7 +160,9 @@ class QueueManager(object):
             user_info: user information dict include project, service and user ids
 
         """
-        bind_list = self.get_bind_list(user_info)
+        bind_list = await self.get_bind_list(user_info)
+        if not self.event_listeners.get(user_info.get("user")):
+            return
 
         for route_key in bind_list:
             self.channel.queue_bind(callback=None,
@@ -168,7 +170,7 @@ class QueueManager(object):
                                     queue=queue,
                                     routing_key=route_key)
 
-    def get_bind_list(self, user_info):
+    async def get_bind_list(self, user_info):
         """
         Args:
             user_info: user information dict include project, service and user ids
@@ -186,10 +188,7 @@ class QueueManager(object):
             subscriber_id=user_id
         )
 
-        channels = self.cache.smembers(subs_channels_key)
-        channels = [channel_id.decode() for channel_id in channels]
-
-        bind_list.extend(channels)
+        bind_list.extend(await self.cache.smembers(subs_channels_key))
         return bind_list
 
     def on_closed(self, connection, _, __):
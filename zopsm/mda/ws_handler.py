@@ -8,7 +8,7 @@ from tornado import websocket, web
 from tornado.ioloop import IOLoop
 
 from zopsm.mda.queue_manager import QueueManager
-from zopsm.lib.credis import ZRedis
+from zopsm.lib.async_redis import AsyncRedis
 from zopsm.lib.sd_consul import consul_client, EnvironmentVariableNotFound
 from zopsm.lib.log_handler import zlogger
 from zopsm.lib.settings import WORKING_ENVIRONMENT
@@ -27,8 +27,9 @@ rabbit_nodes = json.loads(os.getenv('RABBIT_NODES'))
 # master = os.getenv('REDIS_HOST')
 slave = os.getenv('REDIS_SLAVE')
 
-cache = ZRedis(host=slave,
-               db=os.getenv('REDIS_DB'))
+cache = AsyncRedis(host=slave,
+                   db=os.getenv('REDIS_DB'),
+                   decode_responses=True)
 
 if WORKING_ENVIRONMENT in ["zopsm", "develop"]:
     # Consul service and check registration
@@ -54,23 +55,18 @@ class MyWebSocketHandler(websocket.WebSocketHandler):
     def check_origin(self, origin):
         return True
 
-    def get_user_info_and_token(self, token):
+    async def get_user_info_and_token(self, token):
         """
         According to coming token, finds user info and token ttl  from cache.
 
         """
-        token_key = cache.hmget(CACHE_TOKENS_KEYS, token)[0]
+        token_key = (await cache.hmget(CACHE_TOKENS_KEYS, token))[0]
         if not token_key:
             zlogger.error("Unathorized error for token value:{}".format(token if token else "-"))
             raise web.HTTPError(status_code=401,
                                 log_message='Unauthorized error')
-        token_ttl = cache.ttl(token_key.decode())
-
-        stored_value = cache.hgetall(token_key)
-        user = {}
-        if stored_value:
-            for k, v in stored_value.items():
-                user[k.decode()] = v.decode()
+        token_ttl = await cache.ttl(token_key)
+        user = await cache.hgetall(token_key)
 
         return user, token_ttl
 
@@ -97,15 +93,26 @@ class MyWebSocketHandler(websocket.WebSocketHandler):
         """
         To do when a new ws connection.
 
+        """
+        IOLoop.current().spawn_callback(self.subscribe, request_user_id, token)
+
+    async def subscribe(self, request_user_id, token):
+        """
+        Validates the token of the connection and starts to deliver the messages of the user.
+        Runs on the IOLoop without blocking the other connections while redis is queried.
+
         """
         try:
-            user_info, token_ttl = self.get_user_info_and_token(token)
+            user_info, token_ttl = await self.get_user_info_and_token(token)
 
             self.check_validity(user_info, request_user_id, token_ttl)
+            if self.ws_connection is None:
+                # closed by the client while the token is checked
+                return
 
             IOLoop.current().add_timeout(deadline=timedelta(seconds=token_ttl),
                                          callback=self.token_timeout)
-            queue_manager.add_event_listener(self, user_info)
+            await queue_manager.add_event_listener(self, user_info)
         except Exception as exc:
             zlogger.error("An error occurred on open method inside MyWebSocketHandler. "
                           "Exc: {}".format(exc))
@@ -0,0 +1,7 @@
+"""
+ASGI application of the push gateway, see ``zopsm.lib.rest.asgi``.
+"""
+from zopsm.lib.rest.asgi import AsgiAdapter
+from zopsm.push.server import app
+
+application = AsgiAdapter(app)
@@ -77,6 +77,7 @@ class Acknowledgement(ZopsContinuatedListCreateApi):
     """
 
     serializer = AcknowledgementSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Acknowledgement Create"
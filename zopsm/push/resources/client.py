@@ -204,6 +204,7 @@ class Client(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = ClientSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Client Retrieve & Update & Delete"
@@ -401,6 +402,7 @@ class ClientList(ZopsContinuatedListCreateApi):
     """
 
     serializer = ClientSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Client Create & List"
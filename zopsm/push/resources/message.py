@@ -262,6 +262,7 @@ class Message(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = MessageSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Message Retrieve & Update & Delete"
@@ -608,6 +609,7 @@ class MessageList(ZopsContinuatedListCreateApi):
     """
 
     serializer = MessageSerializer()
+    rpc_replay = True
 
     page_size = ZopsIntegerParam(
         details="Specifies number of result entries in single response",
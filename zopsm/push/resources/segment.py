@@ -217,6 +217,7 @@ class Segment(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = SegmentSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Segment Retrieve & Update & Delete"
@@ -627,6 +628,7 @@ class SegmentList(ZopsContinuatedListCreateApi):
     """
 
     serializer = SegmentSerializer()
+    rpc_replay = True
 
     page_size = ZopsIntegerParam(
         details="Specifies number of result entries in single response",
@@ -168,6 +168,7 @@ class ClientTag(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = ClientTagSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Client Tag Retrieve & Update & Delete"
@@ -363,6 +364,7 @@ class ClientTagList(ZopsContinuatedListCreateApi):
     """
 
     serializer = ClientTagSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Client Tag Add & List"
@@ -164,6 +164,7 @@ class Tag(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = TagSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Tag Retrieve & Delete"
@@ -362,6 +363,7 @@ class TagList(ZopsContinuatedListCreateApi):
     """
 
     serializer = TagSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Tag Create & List"
@@ -189,6 +189,7 @@ class UserTag(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = UserTagSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "User Tag Retrieve & Delete"
@@ -388,6 +389,7 @@ class UserTagList(ZopsContinuatedListCreateApi):
     """
 
     serializer = UserTagSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "User Tag Add & List"
@@ -0,0 +1,7 @@
+"""
+ASGI application of the roc gateway, see ``zopsm.lib.rest.asgi``.
+"""
+from zopsm.lib.rest.asgi import AsgiAdapter
+from zopsm.roc.server import app
+
+application = AsgiAdapter(app)
@@ -35,6 +35,7 @@ class AdminChannelSubscriberSerializer(ZopsBaseDBSerializer):
 
 class AdminChannelCreateResource(ZopsContinuatedListCreateApi):
     serializer = AdminChannelSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Admin Channel List & Create"
@@ -141,6 +142,7 @@ class AdminChannelResource(ZopsRetrieveUpdateDeleteApi):
 
 class AdminChannelSubscribersCreateResource(ZopsContinuatedListCreateApi):
     serializer = AdminChannelSubscriberSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Add Subscribers To Channel as Admin User"
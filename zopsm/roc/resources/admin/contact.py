@@ -18,6 +18,7 @@ class ContactSerializer(ZopsBaseDBSerializer):
 
 class AdminContactResource(ZopsContinuatedListCreateApi):
     serializer = ContactSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Admin Contact Create Resource"
@@ -637,6 +637,7 @@ class ChannelList(ZopsContinuatedListCreateApi):
     """
 
     serializer = ChannelSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Channel List & Create"
@@ -62,6 +62,7 @@ class Contact(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = ContactSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Contact Delete"
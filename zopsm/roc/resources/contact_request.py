@@ -164,6 +164,7 @@ class ContactRequest(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = ContactRequestSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Contact Request Accept & Reject"
@@ -222,6 +222,7 @@ class Invite(ZopsRetrieveUpdateDeleteApi):
     """
 
     serializer = InviteSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Invitation Accept & Reject & Cancel"
@@ -201,6 +201,7 @@ class Message(ZopsRetrieveUpdateDeleteApi):
 
     """
     serializer = MessageSerializer()
+    rpc_replay = True
 
     def __repr__(self):
         return "Message Retrieve & Update & Delete"
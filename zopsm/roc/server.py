@@ -19,7 +19,7 @@ from zopsm.roc.resources.admin.channel import AdminChannelSubscribersCreateResou
 from zopsm.roc.resources.admin.channel import AdminChannelResource
 from zopsm.roc.resources.admin.contact import AdminContactResource
 from zopsm.lib.sd_consul import consul_client, EnvironmentVariableNotFound
-from zopsm.lib.rest.resource import ResourceListResource, Ping
+from zopsm.lib.rest.resource import ResourceListResource, Ping, CacheMetrics
 from zopsm.lib.settings import WORKING_ENVIRONMENT
 
 
@@ -103,6 +103,7 @@ roc_admin_endpoints = {
     "/v1/roc/admin/channels/{channel_id}": AdminChannelResource(),
     "/v1/roc/admin/channels/{channel_id}/subscribers": AdminChannelSubscribersCreateResource(),
     "/v1/roc/admin/contact": AdminContactResource(),
+    "/v1/roc/admin/cache-metrics": CacheMetrics(),
 }
 
 
@@ -20,7 +20,8 @@ from zopsm.lib.settings import CACHE_SERVICE_TOKEN_LIST, CACHE_TOKENS_KEYS,CACHE
 from zopsm.lib.settings import CACHE_REFRESH_TOKEN_EXPIRE_IN
 from zopsm.lib.settings import CACHE_SAAS_AUTH_TOKEN, PROJECT_SERVICES_ADMIN_TOKEN, ADMIN_TOKENS
 from zopsm.lib.settings import CACHE_SAAS_RESET_PASSWORD_KEY
-from zopsm.lib.utility import generate_uuid
+from zopsm.lib.settings import REDIS_SCAN_COUNT
+from zopsm.lib.utility import generate_uuid, chunks
 from zopsm.lib.credis import ZRedis
 from zopsm.lib.sd_redis import redis_db_pw
 from zopsm.saas.log_handler import saas_logger
@@ -225,21 +226,22 @@ def delete_consumers_tokens(project_id, service_catalog_code):
                                                          })
 
     If we want to remove user refresh and access token and user info in redis we delete all these token in redis
+
+    Tokens of the service are streamed from its token list and deleted in chunks of
+    ``REDIS_SCAN_COUNT``.
     """
     token_list_key = CACHE_SERVICE_TOKEN_LIST.format(
         project_id=project_id,
         service=service_catalog_code,
     )
-    tokens_set_byte = cache.smembers(token_list_key)
-    tokens_list = [token.decode() for token in tokens_set_byte]
-
-    if tokens_list:
-        tokens_value_byte = cache.hmget(CACHE_TOKENS_KEYS, tokens_list)
-        tokens_value_list = [token_value.decode() for token_value in tokens_value_byte]
+    for tokens_list in chunks(cache.sscan_iter(token_list_key), REDIS_SCAN_COUNT):
+        tokens_value_list = [token_value for token_value in
+                             cache.hmget(CACHE_TOKENS_KEYS, tokens_list) if token_value]
 
         cache.hdel(CACHE_TOKENS_KEYS, *tokens_list)
-        cache.delete(*tokens_value_list)
-        cache.delete(token_list_key)
+        if tokens_value_list:
+            cache.delete(*tokens_value_list)
+    cache.delete(token_list_key)
 
 
 def remove_user_tokens(user_id):
@@ -2,11 +2,13 @@
 
 from zopsm.lib.sd_riak import DEFAULT_BUCKET_TYPE
 from zopsm.lib.settings import DATETIME_FORMAT
+from zopsm.lib.settings import REDIS_SCAN_COUNT
+from zopsm.lib.utility import chunks
 from zopsm.lib.log_handler import zlogger
 from zopsm.lib.sexp_parser import SEXPParser
 from pyrabbit2.http import HTTPError
-from zopsm.lib.credis import ZRedis
 from datetime import datetime
+from itertools import chain
 import hashlib
 import json
 import os
@@ -67,6 +69,31 @@ class BaseWorkerJobs(object):
 
         return obj.data
 
+    def get_objs_data(self, **kwargs):
+        """
+        Gets data of many objects from riak in parallel and delivers it to as RPC response.
+
+        Args:
+            **kwargs(dict):
+                - project_id(str): project id to determine the bucket
+                - bucket_name(str): bucket name
+                - object_ids(list): ids of objects whose data will be retrieved
+        Returns:
+            dict: data of the found objects by their ids
+
+        """
+        bucket = self.get_bucket(kwargs['project_id'], kwargs['bucket_name'])
+        objs_data = {}
+        for obj in bucket.multiget(kwargs['object_ids']):
+            # failed fetches are returned as (bucket type, bucket, key, error) tuples
+            if isinstance(obj, tuple):
+                zlogger.error("Object could not be fetched. Bucket name:{}, id:{}, error:{}".format(
+                    bucket.name, obj[2], obj[3]))
+            elif obj.exists:
+                objs_data[obj.key] = obj.data
+
+        return objs_data
+
     def add_key_to_data(self, project_id, bucket_name, key, bucket_type=DEFAULT_BUCKET_TYPE):
         """
         Adds obj's key to obj's data as 'id' key and returns.
@@ -227,7 +254,7 @@ class BaseWorkerJobs(object):
                 - project_id: project_id
 
         Returns:
-            list: client ids
+            iterator: client ids, streamed from redis in chunks of ``REDIS_SCAN_COUNT``
 
         """
         # target and client buckets are prepared
@@ -269,13 +296,12 @@ class BaseWorkerJobs(object):
         stack = sexp.expression_stack
         final_cache_key = sexp.evaluate_stack(stack[:])
 
-        final_ids = []
-        for member in self.cache.smembers(final_cache_key):
-            member = member.decode()
-            final_ids.append(member)
+        final_ids = (member.decode() for member in self.cache.sscan_iter(final_cache_key))
 
         if case == 'single' and single_case_type == 'target':
-            final_ids = self.get_targets_client_ids(project_id, final_ids)
+            final_ids = chain.from_iterable(
+                self.get_targets_client_ids(project_id, target_ids)
+                for target_ids in chunks(final_ids, REDIS_SCAN_COUNT))
 
         return final_ids
 
@@ -417,10 +443,9 @@ class BaseWorkerJobs(object):
 
 
         """
-        from zopsm.lib.sd_redis import redis_db_pw
+        from zopsm.lib.sd_redis import master_client
 
-        cache = ZRedis(host=redis_master,
-                       password=redis_db_pw,
-                       db=os.getenv('REDIS_DB'))
+        # pooled client shared by all requests, it follows master changes on its own
+        cache = master_client(host=redis_master, db=os.getenv('REDIS_DB'))
 
         self['riak_pb', 'rabbit_cl', 'cache'] = [riak_pb, rabbit_cl, cache]
@@ -0,0 +1,160 @@
+"""
+Fills the subscriber or channel cache of projects from riak, e.g. after a redis failover or
+flush, or before a new redis node is put into service.
+
+Keys are streamed from the riak buckets of the projects, or read from a file of recently active
+object ids, one id per line. Objects are fetched from riak in batches and written to the cache by
+a pool of threads, at most ``--rate`` objects per second.
+
+The cache is written to the redis master of the environment, ``REDIS_MASTER`` selects another
+node. It runs with the environment of the workers.
+
+Usage:
+    python -m zopsm.workers.cache_warmup subscriber project_id [project_id ...]
+    python -m zopsm.workers.cache_warmup channel project_id --ids-file recent_channels.txt
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from threading import Thread
+
+from zopsm.lib import sd_riak
+from zopsm.lib.log_handler import zlogger
+from zopsm.lib.sd_riak import BUCKET_CACHE_MAP, DEFAULT_BUCKET_TYPE
+from zopsm.lib.utility import chunks
+
+BATCH_SIZE = 100
+THREADS = 8
+RATE = 1000  # objects per second
+
+
+class RateLimiter(object):
+    """
+    Spaces out the calls of ``wait`` of all threads to ``rate`` items per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self, count=1):
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next_time, now)
+            self.next_time = start + count * self.interval
+        time.sleep(max(0, start - now))
+
+
+def stream_ids(bucket):
+    """
+    Yields:
+        str: keys of ``bucket``
+    """
+    with closing(bucket.stream_keys()) as stream:
+        for keys in stream:
+            yield from keys
+
+
+def read_ids(path):
+    """
+    Yields:
+        str: non-empty lines of the file at ``path``
+    """
+    with open(path) as ids_file:
+        for line in ids_file:
+            if line.strip():
+                yield line.strip()
+
+
+def warm_up(riak_client, bucket_name, project_id, service, ids=None, batch_size=BATCH_SIZE,
+            threads=THREADS, rate=RATE):
+    """
+    Args:
+        riak_client (RiakClient):
+        bucket_name (str): one of ``BUCKET_CACHE_MAP``
+        project_id (str):
+        service (str): service of the cache keys
+        ids (iterable): ids of the objects to fill, all keys of the bucket if None
+        batch_size (int): objects fetched from riak at once
+        threads (int): batches filled in parallel
+        rate (int): objects filled per second
+
+    Returns:
+        dict: numbers of filled, missing and failed objects
+    """
+    bucket = riak_client.bucket_type(DEFAULT_BUCKET_TYPE).bucket(
+        "{}_{}".format(project_id, bucket_name))
+    cache_class = BUCKET_CACHE_MAP[bucket_name]
+    limiter = RateLimiter(rate)
+    counts = {'filled': 0, 'missing': 0, 'failed': 0}
+    counts_lock = threading.Lock()
+
+    def fill(batch):
+        limiter.wait(len(batch))
+        result = {'filled': 0, 'missing': 0, 'failed': len(batch)}
+        try:
+            objs = bucket.multiget(batch)
+            result['failed'] = 0
+            for obj in objs:
+                # failed fetches are returned as (bucket type, bucket, key, error) tuples
+                if isinstance(obj, tuple):
+                    result['failed'] += 1
+                elif not obj.exists:
+                    result['missing'] += 1
+                else:
+                    try:
+                        cache_class(project_id, service, obj.key).set(obj.data)
+                        result['filled'] += 1
+                    except Exception as e:
+                        zlogger.error("{} {} could not be cached: {}".format(
+                            bucket_name, obj.key, e))
+                        result['failed'] += 1
+        except Exception as e:
+            zlogger.error("A batch of {} {} could not be fetched: {}".format(
+                len(batch), bucket_name, e))
+        with counts_lock:
+            for k, v in result.items():
+                counts[k] += v
+
+    # bounds the batches read ahead of the threads, so that the keys are not held in memory
+    pending = threading.BoundedSemaphore(threads * 2)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for batch in chunks(stream_ids(bucket) if ids is None else ids, batch_size):
+            pending.acquire()
+            pool.submit(fill, batch).add_done_callback(lambda f: pending.release())
+
+    zlogger.info("Cache of {} of project {} is warmed up: {}".format(
+        bucket_name, project_id, counts))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fills the cache of projects from riak.")
+    parser.add_argument('bucket', choices=sorted(BUCKET_CACHE_MAP))
+    parser.add_argument('projects', nargs='+')
+    parser.add_argument('--service', default='roc')
+    parser.add_argument('--ids-file', help="file of object ids, one per line, instead of all "
+                                           "keys of the bucket")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--threads', type=int, default=THREADS)
+    parser.add_argument('--rate', type=int, default=RATE, help="objects per second")
+    args = parser.parse_args()
+
+    Thread(target=sd_riak.watch_riak, daemon=True).start()
+    while not getattr(sd_riak, 'riak_pb'):
+        zlogger.info("Still waiting for riak_pb")
+        time.sleep(0.1)
+
+    for project_id in args.projects:
+        counts = warm_up(sd_riak.riak_pb, args.bucket, project_id, args.service,
+                         ids=read_ids(args.ids_file) if args.ids_file else None,
+                         batch_size=args.batch_size, threads=args.threads, rate=args.rate)
+        print("{} {}: {filled} filled, {missing} missing, {failed} failed".format(
+            project_id, args.bucket, **counts))
+
+
+if __name__ == '__main__':
+    main()
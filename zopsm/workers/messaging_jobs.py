@@ -2,15 +2,17 @@
 
 from zopsm.workers.base_jobs import BaseWorkerJobs
 from zopsm.lib.log_handler import zlogger
+from zopsm.lib.cache.status_cache import presence_since
 from datetime import datetime
+import time
 from zopsm.lib.utility import generate_uuid
 from zopsm.lib.settings import DATETIME_FORMAT
-from zopsm.lib.settings import CACHE_ONLINE_SUBSCRIBERS
-from zopsm.lib.settings import CACHE_IDLE_SUBSCRIBERS
+from zopsm.lib.settings import CACHE_PRESENCE
 from zopsm.lib.settings import CACHE_STATUS
 from zopsm.lib.settings import CACHE_STATUS_EXPIRE
 from zopsm.lib.settings import CACHE_CONTACTS
 from zopsm.lib.sd_riak import RABBIT_HOOK_BUCKET_TYPE
+from zopsm.lib.redis_scripts import scripts, parse_contact_statuses
 
 
 class MessageWorkerJobs(BaseWorkerJobs):
@@ -1152,11 +1154,7 @@ class MessageWorkerJobs(BaseWorkerJobs):
         Returns:
             list : list of statuses of subscriber him/herself and his/her contacts
         """
-        cache_online_subscribers = CACHE_ONLINE_SUBSCRIBERS.format(
-            project_id=kwargs['project_id'],
-            service=kwargs['service'],
-        )
-        cache_idle_subscribers = CACHE_IDLE_SUBSCRIBERS.format(
+        cache_presence = CACHE_PRESENCE.format(
             project_id=kwargs['project_id'],
             service=kwargs['service'],
         )
@@ -1183,9 +1181,11 @@ class MessageWorkerJobs(BaseWorkerJobs):
             now = datetime.now().strftime(DATETIME_FORMAT)
             subscriber_status['last_update_time'] = now
             subscriber_status['last_activity_time'] = now
-            self.cache.hmset(cache_status, subscriber_status)
-            self.cache.sadd(cache_online_subscribers, kwargs['subscriber_id'])
-            self.cache.expire(cache_status, CACHE_STATUS_EXPIRE)
+            with self.cache.pipeline() as pipe:
+                pipe.hmset(cache_status, subscriber_status)
+                pipe.zadd(cache_presence, {kwargs['subscriber_id']: time.time()})
+                pipe.expire(cache_status, CACHE_STATUS_EXPIRE)
+                pipe.execute()
         subscriber_status['id'] = kwargs['subscriber_id']
         result = [subscriber_status]
 
@@ -1193,23 +1193,16 @@ class MessageWorkerJobs(BaseWorkerJobs):
             subscriber = self.get_obj(kwargs['project_id'], 'subscriber', kwargs['subscriber_id'])
             self.cache.sadd(cache_contacts, list(subscriber.data['contacts']))
 
-        cache_online_contacts = "Dyn:{}".format(generate_uuid())
-        cache_idle_contacts = "Dyn:{}".format(generate_uuid())
-        self.cache.sinterstore(cache_online_contacts, cache_online_subscribers, cache_contacts)
-        self.cache.sinterstore(cache_idle_contacts, cache_idle_subscribers, cache_contacts)
-        contacts = list(self.cache.sunion(cache_online_contacts, cache_idle_contacts))
-        self.cache.delete(cache_online_contacts, cache_idle_contacts)
-        for contact in contacts:
-            contact = contact.decode()
-            cache_status_contact = CACHE_STATUS.format(
-                project_id=kwargs['project_id'],
-                service=kwargs['service'],
-                subscriber_id=contact,
-            )
-            contact_status = self.cache.hgetall(cache_status_contact)
-            if contact_status:
-                contact_status['id'] = contact
-                result.append(contact_status)
+        # intersects the contacts with online and idle subscribers and reads their statuses
+        contact_statuses = parse_contact_statuses(scripts.run(
+            self.cache, 'contact_statuses',
+            keys=[cache_presence, cache_contacts],
+            args=[CACHE_STATUS, kwargs['project_id'], kwargs['service'],
+                  presence_since()]))
+
+        for contact, contact_status in contact_statuses:
+            contact_status['id'] = contact.decode()
+            result.append(contact_status)
         return result
 
     def set_status(self, **kwargs):
@@ -1262,24 +1255,16 @@ class MessageWorkerJobs(BaseWorkerJobs):
             service=kwargs['service'],
             subscriber_id=kwargs['subscriber_id']
         )
-        online_subscribers_key = CACHE_ONLINE_SUBSCRIBERS.format(
-            project_id=kwargs['project_id'],
-            service=kwargs['service']
-        )
-        idle_subscribers_key = CACHE_IDLE_SUBSCRIBERS.format(
+        presence_key = CACHE_PRESENCE.format(
             project_id=kwargs['project_id'],
             service=kwargs['service']
         )
 
-        online_contacts_key = "{}:onlines".format(contacts_key)
-        idle_contacts_key = "{}:idles".format(contacts_key)
         contacts_to_notify_key = "{}:Notify".format(contacts_key)
 
-        self.cache.sinterstore(online_contacts_key, contacts_key, online_subscribers_key)
-        self.cache.sinterstore(idle_contacts_key, contacts_key, idle_subscribers_key)
-        self.cache.sunionstore(contacts_to_notify_key, online_contacts_key, idle_contacts_key)
-
-        self.cache.delete(online_contacts_key, idle_contacts_key)
+        scripts.run(self.cache, 'contacts_to_notify',
+                    keys=[contacts_key, presence_key, contacts_to_notify_key],
+                    args=[presence_since()])
 
         # This log actually triggers the computationally intensive delivery operation on the event
         # processor side.
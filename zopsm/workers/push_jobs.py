@@ -1,11 +1,12 @@
 # -*-  coding: utf-8 -*-
 
 from zopsm.lib.settings import DATETIME_FORMAT
+from zopsm.lib.settings import REDIS_SCAN_COUNT
 from zopsm.lib.log_handler import zlogger
 from zopsm.workers.base_jobs import BaseWorkerJobs
 from zopsm.workers.unified_push_sender import send_push_message
 from datetime import datetime
-from zopsm.lib.utility import generate_uuid
+from zopsm.lib.utility import generate_uuid, chunks
 import time
 
 
@@ -406,9 +407,21 @@ class PushWorkerJobs(BaseWorkerJobs):
         self.send_push_message(kwargs['project_id'], kwargs['service'], client_ids, kwargs['validated_message'], message.key)
 
     def send_push_message(self, project_id, service, client_ids, validated_message, message_id):
-        device_tokens = self.group_by_device_type(client_ids, project_id)
-        for device_type, tokens in device_tokens.items():
-            send_push_message(device_type, tokens, validated_message, project_id)
+        """
+        Sends the message to the devices of ``client_ids`` in chunks of ``REDIS_SCAN_COUNT``
+        clients, so that the clients of a large segment are not held in memory at once.
+
+        Args:
+            client_ids (iterable): client ids
+        """
+        device_types = set()
+        for client_ids_chunk in chunks(client_ids, REDIS_SCAN_COUNT):
+            device_tokens = self.group_by_device_type(client_ids_chunk, project_id)
+            for device_type, tokens in device_tokens.items():
+                send_push_message(device_type, tokens, validated_message, project_id)
+            device_types.update(device_tokens)
+
+        for device_type in device_types:
             zlogger.info(
                 "Send Push Message. Project id:{}, message id:{}".format(
                     project_id, message_id),
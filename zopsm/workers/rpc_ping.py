@@ -43,7 +43,7 @@ class Pinger(object):
             "id": self.corr_id
         }
         self.channel.basic_publish(exchange='inter_comm',
-                                   routing_key='get_message',
+                                   routing_key='ping',
                                    properties=pika.BasicProperties(
                                        reply_to=self.callback_queue,
                                        correlation_id=self.corr_id,
@@ -51,7 +51,7 @@ class Pinger(object):
                                    body=json.dumps(self.message_properties, ensure_ascii=False))
         zlogger.info("Send PING message to Riak.")
         while self.response is None:
-            self.connection.process_data_events()
+            self.connection.process_data_events(time_limit=None)
         return self.response
 
 
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 import json
 import pika
+import queue
 import random
+import socket
+from pika.adapters.select_connection import READ
 from pyrabbit2.http import HTTPError
 from zopsm.lib import sd_rabbit
 from zopsm.lib.log_handler import zlogger
@@ -37,6 +40,10 @@ class RpcServer(object):
         self._channel = None
         self._closing = False
         self._consumer_tag = None
+        self._callbacks = queue.Queue()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
 
     def new_host(self):
         '''
@@ -82,9 +89,47 @@ class RpcServer(object):
 
         """
         zlogger.info('Connection opened')
+        self._connection.ioloop.add_handler(self._wakeup_r.fileno(), self.on_wakeup, READ)
         self.add_on_connection_close_callback()
         self.open_channel()
 
+    def add_callback_threadsafe(self, callback):
+        """Schedule the callback to be invoked on the IOLoop thread. This is
+        the only method that may be called from other threads, pika objects
+        must only be used on the IOLoop thread. The callback is queued and the
+        IOLoop is woken up by writing to a socket it watches.
+
+        :param callable callback: The callback without arguments
+
+        """
+        self._callbacks.put(callback)
+        try:
+            self._wakeup_w.send(b'x')
+        except BlockingIOError:
+            # the buffer is full of wakeups that are not read yet
+            pass
+
+    def on_wakeup(self, fileno, events, write_only=False):
+        """Invoked by the IOLoop when add_callback_threadsafe wakes it up.
+        Invokes the queued callbacks.
+
+        """
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        while True:
+            try:
+                callback = self._callbacks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback()
+            except Exception as e:
+                zlogger.error('Callback of the IOLoop failed: %s', e)
+
     def add_on_connection_close_callback(self):
         """This method adds an on close callback that will be invoked by pika
         when RabbitMQ closes the connection to the publisher unexpectedly.
@@ -104,6 +149,8 @@ class RpcServer(object):
 
         """
         self._channel = None
+        # the IOLoop of the connection is left, the handler is added to the one of the next
+        connection.ioloop.remove_handler(self._wakeup_r.fileno())
         if self._closing:
             self._connection.ioloop.stop()
         else:
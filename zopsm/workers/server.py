@@ -6,6 +6,8 @@ import random
 import time
 import consul
 import inspect
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from zopsm.lib.sd_consul import consul_client, EnvironmentVariableNotFound
 from zopsm.lib import sd_riak
 from zopsm.lib import sd_rabbit
@@ -15,9 +17,10 @@ from zopsm.workers.push_jobs import PushWorkerJobs
 from zopsm.workers.messaging_jobs import MessageWorkerJobs
 from zopsm.workers.rpc_server import RpcServer
 from threading import Thread
-from json import JSONDecodeError
+from zopsm.lib.codec import CodecError, codecs, get_codec, json_codec
 from zopsm.lib.log_handler import zlogger
-from zopsm.lib.settings import WORKING_ENVIRONMENT
+from zopsm.lib.settings import WORKING_ENVIRONMENT, RPC_DEFAULT_QUEUE_GROUP, RPC_QUEUE_GROUPS, \
+    RPC_QUEUE, RPC_WORKER_QUEUE_GROUPS, RPC_WORKER_CONCURRENCY, RPC_WORKER_PREFETCH
 from zopsm.saas.log_handler import saas_logger
 
 container_name = os.getenv('CONTAINER_NAME', 'dev_workers_1')
@@ -41,9 +44,23 @@ if WORKING_ENVIRONMENT in ["zopsm", "develop"]:
 
 
 class RPCServer(RpcServer):
-    def __init__(self, riak_pb, rabbit_cl, redis_master):
+    """
+    Executes the jobs of a queue group, see ``RPC_QUEUE_GROUPS``.
 
-        # self.QUEUE = 'rpc_queue_%s' % os.getenv('WORKER_NAME', random.randint(999, 99999))
+    Jobs are executed by a pool of ``concurrency`` threads, so that the IOLoop keeps receiving
+    requests while the jobs wait on riak and redis. Up to ``prefetch_count`` requests are
+    delivered before they are acknowledged. A request is acknowledged after its reply is
+    published, both on the IOLoop thread, so the requests of a lost connection are redelivered.
+    """
+
+    def __init__(self, riak_pb, rabbit_cl, redis_master, queue_group=RPC_DEFAULT_QUEUE_GROUP,
+                 concurrency=RPC_WORKER_CONCURRENCY, prefetch_count=RPC_WORKER_PREFETCH):
+        if queue_group not in RPC_QUEUE_GROUPS:
+            raise ValueError("Unknown rpc queue group: {}".format(queue_group))
+
+        self.prefetch_count = prefetch_count or concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.QUEUE = RPC_QUEUE.format(group=queue_group)
         self.EXCHANGE = os.getenv("RABBIT_EXCHANGE", "inter_comm")
         self.VIRTUAL_HOST = os.getenv('RABBIT_VIRTUAL_HOST', 'zopsm')
         self.CREDENTIALS = sd_rabbit.rabbit_credential
@@ -68,12 +85,12 @@ class RPCServer(RpcServer):
 
         push_jobs.extend(message_jobs)  # all methods from push and message worker classes to bind
         push_jobs.append('ping')
-        self.ROUTING_KEYS = push_jobs
+        self.ROUTING_KEYS = queue_group_methods(queue_group, push_jobs)
         super(RPCServer, self).__init__()
 
     def on_request(self, ch, method, props, body):
         """
-        Publishes response by using do_job method
+        Executes the job of the request in the pool, its response is published by ``reply``.
         Args:
             ch: Channel
             method: Method
@@ -83,15 +100,71 @@ class RPCServer(RpcServer):
         Returns:
             None
         """
+        self.executor.submit(self.run_job, body, props.content_type).add_done_callback(
+            lambda future: self.add_callback_threadsafe(
+                partial(self.reply, ch, method, props, future.result())))
+
+    def run_job(self, body, content_type=None):
+        """
+        Runs ``do_job`` in a thread of the pool. Its unexpected errors are replied as internal
+        errors, so that the request is acknowledged and its caller does not wait for a timeout.
+        Args:
+            body: Message Body
+            content_type (str): content type of the body
+
+        Returns:
+            dict|list: json-rpc response, list of the responses of the requests of a batch
+        """
+        try:
+            return self.do_job(body, content_type)
+        except Exception as e:
+            zlogger.error("Internal error: {}".format(e))
+            return {"jsonrpc": "2.0", "id": None,
+                    "error": {"code": -32603, "message": "Internal Error"}}
+
+    def do_job(self, body, content_type=None):
+        """
+        Executes the job of a request, or the jobs of a batch request one by one, runs in a thread
+        of the pool.
+        Args:
+            body: Message Body
+            content_type (str): content type of the body, see ``zopsm.lib.codec``
+
+        Returns:
+            dict|list: json-rpc response, list of the responses of the requests of a batch
+        """
+        try:
+            body = get_codec(content_type).decode(body)
+        except CodecError as e:
+            zlogger.error("Parse error: {}".format(e))
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse Error"}}
+
+        if isinstance(body, list):
+            if not body:
+                return {"jsonrpc": "2.0", "id": None,
+                        "error": {"code": -32600, "message": "Invalid Request"}}
+            return [self.execute(request) for request in body]
+
+        return self.execute(body)
+
+    def execute(self, body):
+        """
+        Executes the job of a request.
+        Args:
+            body (dict): json-rpc request
+
+        Returns:
+            dict: json-rpc response
+        """
 
         err = None
         err_msg = ""
         result = {}
-        id = None
+        # errors of the requests of a batch are matched to them by id
+        id = body.get('id') if isinstance(body, dict) else None
         params = {}
 
         try:
-            body = json.loads(body)
             try:
                 rabbit_cl = sd_rabbit.get_suitable_client(json.loads(sd_rabbit.rabbit_nodes))
                 jobs_inst = self.jobs[body['params']['service']]
@@ -101,7 +174,6 @@ class RPCServer(RpcServer):
                 try:
                     params = body['params']
                     result = worker_method(**params)
-                    id = body['id']
                 except TypeError as e:
                     err_msg = "Invalid params: {}".format(e)
                     err = {"code": -32602, "message": "Invalid Params"}
@@ -118,9 +190,6 @@ class RPCServer(RpcServer):
             except ImportError as e:
                 err_msg = "Method not found: {}".format(e)
                 err = {"code": -32601, "message": "Method Not Found"}
-        except JSONDecodeError as e:
-            err_msg = "Parse error: {}".format(e)
-            err = {"code": -32700, "message": "Parse Error"}
         except Exception as e:
             err_msg = "Internal error: {}".format(e)
             err = {"code": -32603, "message": "Internal Error"}
@@ -146,7 +215,7 @@ class RPCServer(RpcServer):
                         blocking=not params.get('trackable')
             )
             zlogger.error(msg)
-            if params and params['trackable']:
+            if params.get('trackable'):
                 zlogger.info("",
                     extra={
                         "purpose": "event",
@@ -165,10 +234,33 @@ class RPCServer(RpcServer):
         else:
             response['result'] = result
 
+        return response
+
+    def reply(self, ch, method, props, response):
+        """
+        Publishes the response of a request and acknowledges it, runs on the IOLoop thread.
+        Args:
+            ch: Channel
+            method: Method
+            props: Properties
+            response (dict): json-rpc response
+
+        Returns:
+            None
+        """
+        if ch.is_closed:
+            # the request is redelivered, delivery tags are valid on their own channel only
+            zlogger.warning("Channel is closed, response of request {} is dropped.".format(
+                props.correlation_id))
+            return
+
+        # replied with the codec of the request, json if it is not supported
+        codec = codecs.get(props.content_type, json_codec)
         ch.basic_publish(exchange='',
                          routing_key=props.reply_to,
-                         properties=pika.BasicProperties(correlation_id=props.correlation_id),
-                         body=json.dumps(response))
+                         properties=pika.BasicProperties(correlation_id=props.correlation_id,
+                                                         content_type=codec.content_type),
+                         body=codec.encode(response))
 
         ch.basic_ack(delivery_tag=method.delivery_tag)
 
@@ -179,12 +271,27 @@ class RPCServer(RpcServer):
 
         """
         self.add_on_cancel_callback()
-        self._channel.basic_qos(prefetch_count=1)
+        self._channel.basic_qos(prefetch_count=self.prefetch_count)
         self._consumer_tag = self._channel.basic_consume(consumer_callback=self.on_request,
                                                          queue=self.QUEUE)
         zlogger.info("Started consuming...")
 
 
+def queue_group_methods(queue_group, methods):
+    """
+    Args:
+        queue_group (str): one of ``RPC_QUEUE_GROUPS``
+        methods (list): names of all jobs
+
+    Returns:
+        list: names of the jobs of ``queue_group``
+    """
+    if queue_group != RPC_DEFAULT_QUEUE_GROUP:
+        return list(RPC_QUEUE_GROUPS[queue_group])
+    grouped = {method for group in RPC_QUEUE_GROUPS.values() for method in group}
+    return [method for method in methods if method not in grouped]
+
+
 def main():
     t1 = Thread(target=sd_rabbit.watch_rabbit)
     t2 = Thread(target=sd_riak.watch_riak)
@@ -203,10 +310,11 @@ def main():
 
     rabbit_cl = sd_rabbit.get_suitable_client(json.loads(sd_rabbit.rabbit_nodes))
 
-    rpcserver = RPCServer(sd_riak.riak_pb, rabbit_cl, sd_redis.redis_master)
-    t3 = Thread(target=rpcserver.run)
-    t3.start()
-    zlogger.info("Started RpcServer...")
+    for queue_group in RPC_WORKER_QUEUE_GROUPS:
+        rpcserver = RPCServer(sd_riak.riak_pb, rabbit_cl, sd_redis.redis_master, queue_group)
+        t3 = Thread(target=rpcserver.run)
+        t3.start()
+        zlogger.info("Started RpcServer of {} jobs...".format(queue_group))
 
 
 if __name__ == '__main__':